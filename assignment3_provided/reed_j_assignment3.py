@@ -4,12 +4,15 @@ Date: 10/10/25
 Assignment: 3
 Due Date: 10/13/25
 About this project: This program refactors the 2D Simulation of Prisoners Dilemma from a sequential to parallel execution 
-Assumptions: assumes no more than 3 args gridSize, steps, and nprocs
+Assumptions: assumes no more than 7 args gridSize, steps, nprocs, halo depth, backend ('mp' or 'threads'),
+             trace file prefix ('-' for none), and rebalance interval in steps
 All work below was performed solely by Jimmy.
 I used code generated by an AI tool.
 """
 
 import sys
+import json
+import time
 
 # Payoff matrix
 # payoff[player_action][opponent_action]
@@ -21,6 +24,10 @@ payoffMatrix = [
 gridSize = 10
 steps = 10
 nprocs_opt = None
+halo_depth = 1
+backend = 'mp'
+trace_prefix = None
+rebalance_every = None
 
 if (len(sys.argv) > 1):
     gridSize = int(sys.argv[1])
@@ -30,6 +37,18 @@ if (len(sys.argv) > 2):
 
 if (len(sys.argv) > 3):
     nprocs_opt = int(sys.argv[3])
+
+if (len(sys.argv) > 4):
+    halo_depth = int(sys.argv[4])
+
+if (len(sys.argv) > 5):
+    backend = sys.argv[5]
+
+if (len(sys.argv) > 6):
+    trace_prefix = sys.argv[6] if sys.argv[6] != '-' else None
+
+if (len(sys.argv) > 7):
+    rebalance_every = int(sys.argv[7])
     
 cooperate = 0
 defect = 1
@@ -76,76 +95,280 @@ def initializeActionGrid4(size):
 # ------------------------------------------------------
 
 import multiprocessing as mp
+import threading
+
+try:
+    import numpy as np
+except ImportError:  # only the threads backend needs numpy
+    np = None
 
 def split_bounds(nrows, nprocs):
-    size = (nrows + nprocs - 1) // nprocs
+    """strip sizes differ by at most one row so no strip ends up thinner than nrows // nprocs"""
+    size, extra = divmod(nrows, nprocs)
     bounds = []
+    s = 0
     for i in range(nprocs):
-        s = i * size
-        e = min(nrows, s + size)
+        e = s + size + (1 if i < extra else 0)
         if s < e:
             bounds.append((s, e))
+        s = e
     return bounds
 
-def init_action_value(init_id, n, i, j):
+def fill_action_rows(buf, init_id, n, row0):
+    """initialize the global rows starting at row0 held in buf (n bytes per row) with slice fills
+    instead of a per-cell loop, buf starts out all cooperate (0)"""
+    nrows = len(buf) // n
+    row1 = row0 + nrows
+
+    def set_cell(i, j):
+        if row0 <= i < row1:
+            buf[(i - row0) * n + j] = 1
+
     if init_id == 1:
-        return 0 if i < (n / 2) else 1
+        # rows with i >= n / 2 defect
+        lo = max(row0, (n + 1) // 2)
+        if lo < row1:
+            buf[(lo - row0) * n:] = b'\x01' * ((row1 - lo) * n)
     elif init_id == 2:
-        return 1 if i == j else 0
+        for i in range(row0, row1):
+            set_cell(i, i)
     elif init_id == 3:
-        if i == (n // 2) and j == (n // 2):
-            return 1
-        return 0
+        set_cell(n // 2, n // 2)
     elif init_id == 4:
         if n > 1:
-            return 1 if (i == 1 and j == 1) else 0
+            set_cell(1, 1)
         else:
-            return 1 if (i == 0 and j == 0) else 0
+            set_cell(0, 0)
     else:
-        return 0 if (i + j) % 2 == 0 else 1
+        # checkerboard, (i + j) odd defects
+        pattern = b'\x00\x01' * (n // 2 + 1)
+        for i in range(row0, row1):
+            base = (i - row0) * n
+            buf[base:base + n] = pattern[i % 2:i % 2 + n]
 
 
-def halo_worker(rank, start, end, N, nprocs, init_id, steps, act_down, act_up, rew_down, rew_up, result_queue):
-    rows = end - start
+ROW_DIGITS = bytes.maketrans(b'\x00\x01', b'01')
+
+
+def grid_line_offset(i, n):
+    """byte offset of row i in an output file, every line is f"{i}: [a, b, ...]\\n" with 0/1 cells
+    so it is 3n + 3 bytes plus the digits of i"""
+    label_chars = 0
+    lo, digits = 0, 1
+    while lo < i:
+        hi = min(i, 10 ** digits)
+        label_chars += (hi - lo) * digits
+        lo, digits = hi, digits + 1
+    return i * (3 * n + 3) + label_chars
+
+
+def write_rows(fName, buf, n, row0):
+    """write the rows in buf (global rows starting at row0) at their place in fName, same text as
+    the sequential version. lines have known offsets so ranks can write their strips independently"""
+    with open(fName, "r+b") as f:
+        f.seek(grid_line_offset(row0, n))
+        for i_local in range(len(buf) // n):
+            cells = buf[i_local * n:(i_local + 1) * n].translate(ROW_DIGITS).decode()
+            f.write(f"{row0 + i_local}: [{', '.join(cells)}]\n".encode())
+
+
+def init_id_for(initF):
+    """map an initializer function to the id used by fill_action_rows"""
+    init_name = initF.__name__
+    if 'Grid1' in init_name:
+        return 1
+    elif 'Grid2' in init_name:
+        return 2
+    elif 'Grid3' in init_name:
+        return 3
+    elif 'Grid4' in init_name:
+        return 4
+    else:
+        return 1
+
+
+class Spans:
+    """(name, start, end) timings for one rank, does nothing unless enabled"""
+    def __init__(self, enabled):
+        self.enabled = enabled
+        self.events = []
+
+    def mark(self):
+        return time.perf_counter() if self.enabled else 0.0
+
+    def add(self, name, t0):
+        if self.enabled:
+            self.events.append((name, t0, time.perf_counter()))
+
+
+WAIT_SPANS = ('halo send', 'halo wait', 'barrier wait', 'rebalance')
+TRANSFER_SPANS = ('result send', 'write rows')
+
+
+def write_trace(fName, rank_events, parent_events):
+    """write a chrome://tracing / Perfetto json file and print compute vs wait per rank"""
+    all_events = [e for evs in rank_events for e in evs] + parent_events
+    t_base = min((t0 for _, t0, _ in all_events), default=0.0)
+
+    trace = []
+    tracks = [(f"rank {r}", evs) for r, evs in enumerate(rank_events)] + [("parent", parent_events)]
+    for tid, (track, evs) in enumerate(tracks):
+        trace.append({"name": "thread_name", "ph": "M", "pid": 0, "tid": tid, "args": {"name": track}})
+        for name, t0, t1 in evs:
+            trace.append({"name": name, "ph": "X", "pid": 0, "tid": tid,
+                          "ts": (t0 - t_base) * 1e6, "dur": (t1 - t0) * 1e6})
+    with open(fName, "w") as f:
+        json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, f)
+
+    print(f"trace written to {fName}")
+    for rank, evs in enumerate(rank_events):
+        if not evs:
+            continue
+        wall = max(t1 for _, _, t1 in evs) - min(t0 for _, t0, _ in evs)
+        wait = sum(t1 - t0 for name, t0, t1 in evs if name in WAIT_SPANS)
+        xfer = sum(t1 - t0 for name, t0, t1 in evs if name in TRANSFER_SPANS)
+        comp = sum(t1 - t0 for name, t0, t1 in evs) - wait - xfer
+        wall = wall or 1e-9
+        print(f"rank {rank}: compute {comp:.3f}s ({comp / wall:.0%}), wait {wait:.3f}s ({wait / wall:.0%}), "
+              f"output {xfer:.3f}s ({xfer / wall:.0%}), wall {wall:.3f}s")
+    for name in dict.fromkeys(name for name, _, _ in parent_events):
+        total = sum(t1 - t0 for n, t0, t1 in parent_events if n == name)
+        print(f"parent {name}: {total:.3f}s")
+
+
+# strips whose compute times are within this fraction of each other are left alone
+REBALANCE_TOLERANCE = 0.02
+
+
+def rebalance_shift(t_up, rows_up, t_down, rows_down, ghost):
+    """rows to move across the boundary between two neighboring strips given their compute times,
+    positive moves the boundary down (the upper strip grows). both neighbors call this with the
+    same numbers so they agree without a coordinator"""
+    if t_up <= 0 or t_down <= 0:
+        return 0
+    if abs(t_up - t_down) <= REBALANCE_TOLERANCE * max(t_up, t_down):
+        return 0
+    cost_up, cost_down = t_up / rows_up, t_down / rows_down
+    target_up = (rows_up + rows_down) * cost_down / (cost_up + cost_down)
+    # only go half way, both boundaries of a strip move at the same time
+    shift = int((target_up - rows_up) / 2)
+    # never give away more than half the rows beyond a ghost zone, so after moving both
+    # boundaries every strip can still fill its neighbors' ghost rows by itself
+    shift = min(shift, (rows_down - ghost) // 2)
+    shift = max(shift, -((rows_up - ghost) // 2))
+    return shift
+
+
+def halo_worker(rank, start, end, N, nprocs, init_id, steps, depth, act_down, act_up, result_queue, fName,
+                trace=False, rebalance_every=None):
+    """owns rows [start, end) plus 2*depth ghost rows on each side that has a neighbor.
+    ghost rows are recomputed locally so actions only need exchanging every depth steps.
+    with rebalance_every=M, neighbors compare compute times at the first exchange after every
+    M steps and move their shared boundary, the migrated rows travel with that halo exchange.
+    writes the rows it ends up owning straight into fName, then sends its final (start, end)
+    and the span timings if trace"""
+    spans = Spans(trace)
+    t0 = spans.mark()
     width = N
+    ghost = 2 * depth
+
+    has_up = (rank > 0)
+    has_down = (rank + 1) < nprocs
+
+    # local rows cover the owned strip and its ghost zones
+    ext_start = start - ghost if has_up else start
+    ext_end = end + ghost if has_down else end
+    rows = ext_end - ext_start
+    own_lo = start - ext_start
+    own_hi = end - ext_start
 
     act_curr = bytearray(rows * width)
     act_next = bytearray(rows * width)
     rew_curr = bytearray(rows * width)
 
-    # local actions to process
-    for i_local in range(rows):
-        i = start + i_local
-        base = i_local * width
-        for j in range(width):
-            act_curr[base + j] = init_action_value(init_id, N, i, j)
+    # ghost rows are initialized too so the first depth steps need no exchange
+    fill_action_rows(act_curr, init_id, N, ext_start)
+    spans.add('init', t0)
 
-    has_up = (rank > 0)
-    has_down = (rank + 1) < nprocs
     if has_up:
         q_act_from_up = act_down[rank - 1]  # from up neighbor
         q_act_to_up = act_up[rank - 1]      # to up neighbor
-        q_rew_from_up = rew_down[rank - 1]
-        q_rew_to_up = rew_up[rank - 1]
     if has_down:
         q_act_to_down = act_down[rank]      # to down neighbor
         q_act_from_down = act_up[rank]      # from down neighbor
-        q_rew_to_down = rew_down[rank]
-        q_rew_from_down = rew_up[rank]
 
     p = payoffMatrix
-
-    for _step in range(steps):
-        # exchange action rows
-        if has_up:
-            q_act_to_up.put(bytes(act_curr[0:width]))
-        if has_down:
-            q_act_to_down.put(bytes(act_curr[(rows - 1) * width: rows * width]))
-        top_act_halo = q_act_from_up.get() if has_up else None
-        bot_act_halo = q_act_from_down.get() if has_down else None
+    compute_time = 0.0
+    last_balance = 0
+
+    for step in range(steps):
+        sub = step % depth
+        # exchange ghost rows once every depth steps
+        if sub == 0 and step > 0:
+            new_start, new_end = start, end
+            if rebalance_every and step - last_balance >= rebalance_every:
+                t0 = spans.mark()
+                report = (compute_time, end - start)
+                if has_up:
+                    q_act_to_up.put(report)
+                if has_down:
+                    q_act_to_down.put(report)
+                if has_up:
+                    t_up, rows_up = q_act_from_up.get()
+                    new_start = start + rebalance_shift(t_up, rows_up, compute_time, end - start, ghost)
+                if has_down:
+                    t_down, rows_down = q_act_from_down.get()
+                    new_end = end + rebalance_shift(compute_time, end - start, t_down, rows_down, ghost)
+                compute_time = 0.0
+                last_balance = step
+                spans.add('rebalance', t0)
+
+            # neighbors get the owned rows that fall in their (possibly moved) strip or ghost zone
+            t0 = spans.mark()
+            # (clamped, the ranges are empty when a neighbor grew past its whole ghost zone)
+            if has_up:
+                send_hi = max(start, new_start + ghost)
+                q_act_to_up.put(bytes(act_curr[(start - ext_start) * width:(send_hi - ext_start) * width]))
+            if has_down:
+                send_lo = min(end, new_end - ghost)
+                q_act_to_down.put(bytes(act_curr[(send_lo - ext_start) * width:(end - ext_start) * width]))
+            spans.add('halo send', t0)
+
+            if (new_start, new_end) != (start, end):
+                new_ext_start = new_start - ghost if has_up else new_start
+                new_ext_end = new_end + ghost if has_down else new_end
+                new_rows = new_ext_end - new_ext_start
+                # keep the owned rows that are still inside the new local range
+                keep_lo, keep_hi = max(start, new_ext_start), min(end, new_ext_end)
+                moved = bytearray(new_rows * width)
+                moved[(keep_lo - new_ext_start) * width:(keep_hi - new_ext_start) * width] = \
+                    act_curr[(keep_lo - ext_start) * width:(keep_hi - ext_start) * width]
+                act_curr = moved
+                act_next = bytearray(new_rows * width)
+                rew_curr = bytearray(new_rows * width)
+                start, end = new_start, new_end
+                ext_start, ext_end, rows = new_ext_start, new_ext_end, new_rows
+                own_lo = start - ext_start
+                own_hi = end - ext_start
+
+            t0 = spans.mark()
+            if has_up:
+                blob = q_act_from_up.get()
+                act_curr[0:len(blob)] = blob
+            if has_down:
+                blob = q_act_from_down.get()
+                act_curr[rows * width - len(blob):rows * width] = blob
+            spans.add('halo wait', t0)
+
+        t0 = spans.mark()
+        t_compute = time.perf_counter()
+
+        # each step invalidates 2 more ghost rows (reward then action), skip those
+        lo = 2 * sub if has_up else 0
+        hi = rows - 2 * sub if has_down else rows
 
         # compute rewards
-        for i_local in range(rows):
+        for i_local in range(lo, hi):
             base = i_local * width
             im1 = (i_local - 1) * width
             ip1 = (i_local + 1) * width
@@ -154,28 +377,16 @@ def halo_worker(rank, start, end, N, nprocs, init_id, steps, act_down, act_up, r
                 total = 0
                 if i_local > 0:
                     total += p[a][act_curr[im1 + j]]
-                elif has_up and top_act_halo is not None:
-                    total += p[a][top_act_halo[j]]
                 if i_local + 1 < rows:
                     total += p[a][act_curr[ip1 + j]]
-                elif has_down and bot_act_halo is not None:
-                    total += p[a][bot_act_halo[j]]
                 if j + 1 < width:
                     total += p[a][act_curr[base + (j + 1)]]
                 if j > 0:
                     total += p[a][act_curr[base + (j - 1)]]
                 rew_curr[base + j] = total
 
-        # exchange rows
-        if has_up:
-            q_rew_to_up.put(bytes(rew_curr[0:width]))
-        if has_down:
-            q_rew_to_down.put(bytes(rew_curr[(rows - 1) * width: rows * width]))
-        top_rew_halo = q_rew_from_up.get() if has_up else None
-        bot_rew_halo = q_rew_from_down.get() if has_down else None
-
         # update actions
-        for i_local in range(rows):
+        for i_local in range(lo, hi):
             base = i_local * width
             im1 = (i_local - 1) * width
             ip1 = (i_local + 1) * width
@@ -188,22 +399,12 @@ def halo_worker(rank, start, end, N, nprocs, init_id, steps, act_down, act_up, r
                     if r > best_reward:
                         best_reward = r
                         best_action = act_curr[im1 + j]
-                elif has_up and top_rew_halo is not None and top_act_halo is not None:
-                    r = top_rew_halo[j]
-                    if r > best_reward:
-                        best_reward = r
-                        best_action = top_act_halo[j]
 
                 if i_local + 1 < rows:
                     r = rew_curr[ip1 + j]
                     if r > best_reward:
                         best_reward = r
                         best_action = act_curr[ip1 + j]
-                elif has_down and bot_rew_halo is not None and bot_act_halo is not None:
-                    r = bot_rew_halo[j]
-                    if r > best_reward:
-                        best_reward = r
-                        best_action = bot_act_halo[j]
 
                 if j + 1 < width:
                     idx_e = base + (j + 1)
@@ -221,39 +422,52 @@ def halo_worker(rank, start, end, N, nprocs, init_id, steps, act_down, act_up, r
                 act_next[base + j] = best_action
 
         act_curr, act_next = act_next, act_curr
-
-    result_queue.put(bytes(act_curr))
-
-
-def run_sim_haloMP(initF, size=8, steps=10, fName='haloMP.txt', nprocs_opt=None):
-    """uses top and bottom rows exchanged between adjacent workers to avoid whole grid copying"""
+        compute_time += time.perf_counter() - t_compute
+        spans.add('compute', t0)
+
+    t0 = spans.mark()
+    write_rows(fName, act_curr[own_lo * width:own_hi * width], N, start)
+    spans.add('write rows', t0)
+    result_queue.put((start, end))
+    if trace:
+        result_queue.put(spans.events)
+
+
+def run_sim_haloMP(initF, size=8, steps=10, fName='haloMP.txt', nprocs_opt=None, halo_depth=1, trace_file=None,
+                   rebalance_every=None, timings=False):
+    """uses top and bottom rows exchanged between adjacent workers to avoid whole grid copying.
+    halo_depth=k keeps 2k ghost rows per side so neighbors only synchronize every k steps.
+    trace_file writes per-rank compute / halo wait / result timings as a chrome trace.
+    rebalance_every=M lets neighbors move strip boundaries toward equal compute time every M steps.
+    timings=True returns the (per-rank, parent) spans instead of only writing them"""
+    trace = trace_file is not None or timings
+    spans = Spans(trace)
+    t0 = spans.mark()
 
     ctx = mp.get_context('fork') if 'fork' in mp.get_all_start_methods() else mp.get_context()
 
-    # Map initializer to an ID
-    init_name = initF.__name__
-    if 'Grid1' in init_name:
-        init_id = 1
-    elif 'Grid2' in init_name:
-        init_id = 2
-    elif 'Grid3' in init_name:
-        init_id = 3
-    elif 'Grid4' in init_name:
-        init_id = 4
-    else:
-        init_id = 1
+    init_id = init_id_for(initF)
 
     N = size
     procs_requested = nprocs_opt if nprocs_opt is not None else mp.cpu_count()
     nprocs = max(1, min(procs_requested, N, 16))
+    # every strip has to fill its neighbor's ghost zone (at least 2 rows)
+    nprocs = max(1, min(nprocs, N // 2))
 
     row_bounds = split_bounds(N, nprocs)
+    nprocs = len(row_bounds)
+
+    # deeper halos than the thinnest strip can't be filled by one neighbor
+    depth = max(1, halo_depth)
+    if nprocs > 1:
+        depth = max(1, min(depth, min(e - s for s, e in row_bounds) // 2))
+
+    # queues for neighbors, Queue (not SimpleQueue) so wide halos can't deadlock on a full pipe
+    act_down = [ctx.Queue() for _ in range(nprocs - 1)]
+    act_up = [ctx.Queue() for _ in range(nprocs - 1)]
 
-    # queues for neighbors
-    act_down = [ctx.SimpleQueue() for _ in range(nprocs - 1)]
-    act_up = [ctx.SimpleQueue() for _ in range(nprocs - 1)]
-    rew_down = [ctx.SimpleQueue() for _ in range(nprocs - 1)]
-    rew_up = [ctx.SimpleQueue() for _ in range(nprocs - 1)]
+    # workers fill in their own rows of the output file
+    open(fName, "wb").close()
 
     procs = []
     result_queues = []
@@ -261,34 +475,166 @@ def run_sim_haloMP(initF, size=8, steps=10, fName='haloMP.txt', nprocs_opt=None)
         rq = ctx.SimpleQueue()
         result_queues.append(rq)
 
-        p = ctx.Process(target=halo_worker, args=(rank, start, end, N, nprocs, init_id, steps,
-                                                  act_down, act_up, rew_down, rew_up, rq))
+        p = ctx.Process(target=halo_worker, args=(rank, start, end, N, nprocs, init_id, steps, depth,
+                                                  act_down, act_up, rq, fName, trace, rebalance_every))
         p.daemon = False
         procs.append(p)
 
     for p in procs:
         p.start()
+    spans.add('setup', t0)
 
-    slices = []
+    # workers report their final bounds (rebalancing may have moved them) once their rows are written
+    final_bounds = []
+    rank_events = []
     for rank in range(len(procs)):
-        slices.append(result_queues[rank].get())
+        t0 = spans.mark()
+        final_bounds.append(result_queues[rank].get())
+        spans.add('wait workers', t0)
+        if trace:
+            rank_events.append(result_queues[rank].get())
 
+    t0 = spans.mark()
     for p in procs:
         p.join()
+    spans.add('join', t0)
 
-    # Reassemble and write file
-    actionGrid = [[0] * N for _ in range(N)]
-    out_row = 0
-    for (start, end), blob in zip(row_bounds, slices):
-        rows = end - start
-        for i_local in range(rows):
-            row = list(blob[i_local * N:(i_local + 1) * N])
-            actionGrid[out_row] = row
-            out_row += 1
+    if sum(end - start for start, end in final_bounds) != N:
+        raise RuntimeError(f"workers wrote {final_bounds}, expected rows 0..{N - 1}")
 
-    with open(fName, "w") as f:
-        for i in range(N):
-            f.write(f"{i}: {actionGrid[i]}\n")
+    if trace_file is not None:
+        write_trace(trace_file, rank_events, spans.events)
+    if timings:
+        return rank_events, spans.events
+
+# ------------------------------------------------------
+# threads backend: same row strips, one shared numpy grid, no halo copies
+
+def init_action_grid_np(init_id, n):
+    """whole grid from fill_action_rows as int16 so the kernels don't overflow"""
+    buf = bytearray(n * n)
+    fill_action_rows(buf, init_id, n, 0)
+    return np.frombuffer(buf, dtype=np.uint8).reshape(n, n).astype(np.int16)
+
+
+def strip_rewards(act, rew, counts, start, end):
+    """rewards for rows [start, end) using only elementwise ufuncs so the GIL is released.
+    payoff(a, b) is bilinear in a and b since both are 0/1, so the sum over neighbors only
+    needs the neighbor count and the sum of neighbor actions"""
+    (p00, p01), (p10, p11) = payoffMatrix
+    N = act.shape[0]
+    a = act[start:end]
+    nb_sum = np.zeros_like(a)
+    lo = max(start, 1)
+    nb_sum[lo - start:] += act[lo - 1:end - 1]          # north
+    hi = min(end, N - 1)
+    nb_sum[:hi - start] += act[start + 1:hi + 1]        # south
+    nb_sum[:, :-1] += a[:, 1:]                          # east
+    nb_sum[:, 1:] += a[:, :-1]                          # west
+
+    out = rew[start:end]
+    np.multiply(a, p10 - p00, out=out)
+    out += p00
+    out *= counts
+    coef = a * (p11 - p10 - p01 + p00)
+    coef += p01 - p00
+    coef *= nb_sum
+    out += coef
+
+
+def strip_actions(act, rew, act_next, start, end):
+    """best neighbor action for rows [start, end), checked north, south, east, west like getNeighbors"""
+    N = act.shape[0]
+    best_r = rew[start:end].copy()
+    best_a = act_next[start:end]
+    best_a[...] = act[start:end]
+
+    def take(rows_lo, rows_hi, cols, src_rows, src_cols):
+        r = rew[src_rows, src_cols]
+        mask = r > best_r[rows_lo:rows_hi, cols]
+        np.copyto(best_r[rows_lo:rows_hi, cols], r, where=mask)
+        np.copyto(best_a[rows_lo:rows_hi, cols], act[src_rows, src_cols], where=mask)
+
+    all_cols = slice(None)
+    lo = max(start, 1)
+    take(lo - start, end - start, all_cols, slice(lo - 1, end - 1), all_cols)      # north
+    hi = min(end, N - 1)
+    take(0, hi - start, all_cols, slice(start + 1, hi + 1), all_cols)              # south
+    take(0, end - start, slice(0, N - 1), slice(start, end), slice(1, N))          # east
+    take(0, end - start, slice(1, N), slice(start, end), slice(0, N - 1))          # west
+
+
+def run_sim_haloThreads(initF, size=8, steps=10, fName='haloThreads.txt', nprocs_opt=None, trace_file=None,
+                        timings=False):
+    """row strips like run_sim_haloMP but threads share one grid, so there are no processes
+    to start and no halos to copy. only pays off when the numpy kernels release the GIL
+    (or on a free-threaded build)"""
+    trace = trace_file is not None or timings
+    if np is None:
+        raise RuntimeError("the threads backend needs numpy")
+
+    N = size
+    procs_requested = nprocs_opt if nprocs_opt is not None else mp.cpu_count()
+    nthreads = max(1, min(procs_requested, N, 16))
+    row_bounds = split_bounds(N, nthreads)
+
+    act = init_action_grid_np(init_id_for(initF), N)
+    act_next = np.zeros_like(act)
+    rew = np.zeros_like(act)
+
+    # number of in-grid neighbors of each cell
+    counts = np.full((N, N), 4, dtype=np.int16)
+    counts[0, :] -= 1
+    counts[-1, :] -= 1
+    counts[:, 0] -= 1
+    counts[:, -1] -= 1
+
+    barrier = threading.Barrier(len(row_bounds))
+    errors = []
+    rank_spans = [Spans(trace) for _ in row_bounds]
+
+    def strip_worker(rank, start, end):
+        spans = rank_spans[rank]
+        curr, nxt = act, act_next
+        try:
+            for _step in range(steps):
+                t0 = spans.mark()
+                strip_rewards(curr, rew, counts[start:end], start, end)
+                spans.add('compute', t0)
+                t0 = spans.mark()
+                barrier.wait()
+                spans.add('barrier wait', t0)
+                t0 = spans.mark()
+                strip_actions(curr, rew, nxt, start, end)
+                spans.add('compute', t0)
+                t0 = spans.mark()
+                barrier.wait()
+                spans.add('barrier wait', t0)
+                curr, nxt = nxt, curr
+            t0 = spans.mark()
+            write_rows(fName, curr[start:end].astype(np.uint8).tobytes(), N, start)
+            spans.add('write rows', t0)
+        except threading.BrokenBarrierError:
+            pass
+        except Exception as e:
+            errors.append(e)
+            barrier.abort()
+
+    open(fName, "wb").close()
+    workers = [threading.Thread(target=strip_worker, args=(rank, start, end))
+               for rank, (start, end) in enumerate(row_bounds) if rank > 0]
+    for t in workers:
+        t.start()
+    strip_worker(0, *row_bounds[0])   # the calling thread takes the first strip
+    for t in workers:
+        t.join()
+    if errors:
+        raise errors[0]
+
+    if trace_file is not None:
+        write_trace(trace_file, [s.events for s in rank_spans], [])
+    if timings:
+        return [s.events for s in rank_spans], []
 
 # ------------------------------------------------------
 
@@ -303,7 +649,20 @@ if __name__ == '__main__':
     except Exception:
         pass
 
-    run_sim_haloMP(initF = initializeActionGrid1, size=gridSize, steps=steps, fName = f'output_grid1_{gridSize}_{steps}_MP.txt', nprocs_opt=nprocs_opt)
-    run_sim_haloMP(initF = initializeActionGrid2, size=gridSize, steps=steps, fName = f'output_grid2_{gridSize}_{steps}_MP.txt', nprocs_opt=nprocs_opt)
-    run_sim_haloMP(initF = initializeActionGrid3, size=gridSize, steps=steps, fName = f'output_grid3_{gridSize}_{steps}_MP.txt', nprocs_opt=nprocs_opt)
-    run_sim_haloMP(initF = initializeActionGrid4, size=gridSize, steps=steps, fName = f'output_grid4_{gridSize}_{steps}_MP.txt', nprocs_opt=nprocs_opt)
+    if backend not in ('mp', 'threads'):
+        sys.exit(f"unknown backend '{backend}', usage: gridSize steps nprocs halo_depth [mp|threads] "
+                 "trace_prefix rebalance_every")
+    if backend == 'threads' and (halo_depth != 1 or rebalance_every):
+        # one shared grid has no ghost rows to deepen and its strips are fixed
+        print("warning: the threads backend ignores halo depth and rebalance", file=sys.stderr)
+
+    inits = [initializeActionGrid1, initializeActionGrid2, initializeActionGrid3, initializeActionGrid4]
+    for g, initF in enumerate(inits, start=1):
+        fName = f'output_grid{g}_{gridSize}_{steps}_MP.txt'
+        trace_file = f'{trace_prefix}_grid{g}.json' if trace_prefix else None
+        if backend == 'threads':
+            run_sim_haloThreads(initF = initF, size=gridSize, steps=steps, fName = fName, nprocs_opt=nprocs_opt,
+                                trace_file=trace_file)
+        else:
+            run_sim_haloMP(initF = initF, size=gridSize, steps=steps, fName = fName, nprocs_opt=nprocs_opt,
+                           halo_depth=halo_depth, trace_file=trace_file, rebalance_every=rebalance_every)
@@ -1,27 +1,42 @@
 #!/usr/bin/env python3
 import argparse
+import contextlib
+import hashlib
+import importlib.util
+import inspect
+import json
+import math
 import os
+import platform
 import re
+import statistics
 import sys
+import tempfile
+import threading
 import time
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, Tuple, List, Optional
+from typing import Any, Callable, Dict, Tuple, List, Optional
 
 
-def run_cmd(cmd: List[str]) -> Tuple[int, str, str, float]:
+def run_cmd(cmd: List[str], cwd: Optional[str] = None) -> Tuple[int, str, str, float]:
     t0 = time.perf_counter()
-    proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, cwd=cwd)
     dt = time.perf_counter() - t0
     return proc.returncode, proc.stdout, proc.stderr, dt
 
 
-def read_outputs(size: int, steps: int, suffix: str) -> Dict[int, str]:
+def hash_outputs(out_dir: str, size: int, steps: int, suffix: str) -> Dict[int, str]:
+    """sha256 of each output grid file, read in chunks so large grids are never held as strings."""
     outputs = {}
     for init_idx in (1, 2, 3, 4):
-        fname = f"output_grid{init_idx}_{size}_{steps}_{suffix}.txt"
-        with open(fname, "r", encoding="utf-8") as f:
-            outputs[init_idx] = f.read()
+        fname = os.path.join(out_dir, f"output_grid{init_idx}_{size}_{steps}_{suffix}.txt")
+        h = hashlib.sha256()
+        with open(fname, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        outputs[init_idx] = h.hexdigest()
     return outputs
 
 
@@ -38,22 +53,132 @@ def cap_nprocs(requested: int, grid_size: int, cpu_count: int) -> int:
     return max(1, min(requested, grid_size, 16, cpu_count))
 
 
-def run_seq(seq_path: str, size: int, steps: int) -> Tuple[float, Dict[int, str]]:
-    cmd = [sys.executable, seq_path, str(size), str(steps)]
-    rc, out, err, dt = run_cmd(cmd)
-    if rc != 0:
-        raise RuntimeError(f"Sequential run failed (rc={rc}) for size={size}, steps={steps}:\nSTDOUT:\n{out}\nSTDERR:\n{err}")
-    outputs = read_outputs(size, steps, "seq")
-    return dt, outputs
+def run_config(path: str, size: int, steps: int, nprocs: Optional[int]) -> Tuple[float, Dict[int, str]]:
+    """Run one implementation (sequential when nprocs is None) and hash its four output grids.
 
+    Each run gets its own working directory so concurrent runs never overwrite each other's files.
+    """
+    kind = "Sequential" if nprocs is None else "Parallel"
+    cmd = [sys.executable, path, str(size), str(steps)] + ([] if nprocs is None else [str(nprocs)])
+    with tempfile.TemporaryDirectory(prefix="run_tests_") as out_dir:
+        rc, out, err, dt = run_cmd(cmd, cwd=out_dir)
+        if rc != 0:
+            detail = "" if nprocs is None else f", nprocs={nprocs}"
+            raise RuntimeError(f"{kind} run failed (rc={rc}) for size={size}, steps={steps}{detail}:\n"
+                               f"STDOUT:\n{out}\nSTDERR:\n{err}")
+        return dt, hash_outputs(out_dir, size, steps, "seq" if nprocs is None else "MP")
+
+
+class SeqCache:
+    """Sequential reference digests keyed by (size, steps, init), stored on disk so slow baselines
+    like 1024x1024 are only computed once. Entries are tied to a hash of the sequential source."""
+
+    def __init__(self, path: Optional[str], seq_path: str):
+        self.path = path
+        with open(seq_path, "rb") as f:
+            self.source_hash = hashlib.sha256(f.read()).hexdigest()[:16]
+        self.entries: Dict[str, Any] = {}
+        if path and os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError):
+                self.entries = {}
+
+    def key(self, size: int, steps: int, init_idx: int) -> str:
+        return f"{self.source_hash}:{size}:{steps}:{init_idx}"
+
+    def get(self, size: int, steps: int) -> Optional[Tuple[float, Dict[int, str]]]:
+        hits = [self.entries.get(self.key(size, steps, k)) for k in (1, 2, 3, 4)]
+        if any(h is None for h in hits):
+            return None
+        return hits[0]["seconds"], {k: h["digest"] for k, h in zip((1, 2, 3, 4), hits)}
+
+    def put(self, size: int, steps: int, seconds: float, digests: Dict[int, str]):
+        for k, digest in digests.items():
+            self.entries[self.key(size, steps, k)] = {"digest": digest, "seconds": seconds}
+        if self.path:
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump(self.entries, f, indent=2)
+
+
+class CpuBudget:
+    """Lets concurrent runs use at most `total` CPUs, a job needing more than that runs alone."""
+
+    def __init__(self, total: int):
+        self.total = max(1, total)
+        self.used = 0
+        self.cond = threading.Condition()
+
+    @contextlib.contextmanager
+    def claim(self, n: int):
+        with self.cond:
+            while self.used > 0 and self.used + n > self.total:
+                self.cond.wait()
+            self.used += n
+        try:
+            yield
+        finally:
+            with self.cond:
+                self.used -= n
+                self.cond.notify_all()
+
+
+def run_all(seq_path: str, par_path: str, steps: int, seq_sizes: List[int], par_configs: List[Tuple[int, int]],
+            cache: SeqCache, jobs: int) -> Tuple[Dict[int, Any], Dict[Tuple[int, int], Any]]:
+    """Run every needed sequential reference and parallel configuration concurrently within the CPU budget.
+
+    Returns ({size: (seconds, digests) or exception}, {(size, nprocs): (seconds, digests) or exception}).
+    A sequential result marked cached comes from an earlier run.
+    """
+    budget = CpuBudget(jobs)
+    seq_results: Dict[int, Any] = {}
+    par_results: Dict[Tuple[int, int], Any] = {}
+    work: List[Tuple[int, Callable[[], None]]] = []
+
+    for size in dict.fromkeys(seq_sizes):
+        cached = cache.get(size, steps)
+        if cached is not None:
+            seq_results[size] = (cached[0], cached[1], True)
+            continue
+
+        def seq_job(size=size):
+            try:
+                with budget.claim(1):
+                    dt, digests = run_config(seq_path, size, steps, None)
+                cache.put(size, steps, dt, digests)
+                seq_results[size] = (dt, digests, False)
+            except Exception as e:
+                seq_results[size] = e
+        work.append((size * size, seq_job))
+
+    for size, n in dict.fromkeys(par_configs):
+        def par_job(size=size, n=n):
+            try:
+                with budget.claim(n):
+                    par_results[(size, n)] = run_config(par_path, size, steps, n)
+            except Exception as e:
+                par_results[(size, n)] = e
+        work.append((size * size // n, par_job))
+
+    # longest runs first so the slow sequential baselines overlap with everything else
+    work.sort(key=lambda w: -w[0])
+    if work:
+        with ThreadPoolExecutor(max_workers=len(work)) as pool:
+            for f in [pool.submit(job) for _, job in work]:
+                f.result()
+    return seq_results, par_results
 
-def run_par(par_path: str, size: int, steps: int, nprocs: int) -> Tuple[float, Dict[int, str]]:
-    cmd = [sys.executable, par_path, str(size), str(steps), str(nprocs)]
-    rc, out, err, dt = run_cmd(cmd)
-    if rc != 0:
-        raise RuntimeError(f"Parallel run failed (rc={rc}) for size={size}, steps={steps}, nprocs={nprocs}:\nSTDOUT:\n{out}\nSTDERR:\n{err}")
-    outputs = read_outputs(size, steps, "MP")
-    return dt, outputs
+
+def format_details(per_init: Dict[int, bool]) -> str:
+    return ", ".join(f"init{k}={'ok' if per_init[k] else 'x'}" for k in (1, 2, 3, 4))
+
+
+def result_or_exit(result: Any):
+    if isinstance(result, Exception):
+        print(str(result), file=sys.stderr)
+        sys.exit(1)
+    return result
 
 
 def check_header_and_name(par_path: str) -> Tuple[bool, List[str]]:
@@ -94,6 +219,163 @@ def check_header_and_name(par_path: str) -> Tuple[bool, List[str]]:
 def print_header(title: str):
     print(f"\n== {title} ==")
 
+# --- Benchmark mode ---
+
+def load_module(path: str):
+    """Import an assignment script in-process without letting it parse our argv."""
+    saved_argv = sys.argv
+    sys.argv = [path]
+    try:
+        spec = importlib.util.spec_from_file_location(Path(path).stem, path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    finally:
+        sys.argv = saved_argv
+    return module
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """Median and interquartile range of repeated trials."""
+    if len(samples) >= 2:
+        q1, med, q3 = statistics.quantiles(samples, n=4, method="inclusive")
+    else:
+        q1 = med = q3 = samples[0]
+    return {"median": med, "q1": q1, "q3": q3, "iqr": q3 - q1, "min": min(samples), "n": len(samples)}
+
+
+def split_spans(rank_events: List[List[Tuple[str, float, float]]]) -> Tuple[float, float]:
+    """(simulation, output) seconds from per-rank spans, each the slowest rank's."""
+    sim, io = 0.0, 0.0
+    for evs in rank_events:
+        work = [e for e in evs if e[0] != "write rows"]
+        if work:
+            sim = max(sim, max(t1 for _, _, t1 in work) - min(t0 for _, t0, _ in work))
+        io = max(io, sum(t1 - t0 for name, t0, t1 in evs if name == "write rows"))
+    return sim, io
+
+
+def bench_config(runner: Callable, initF: Callable, size: int, steps: int, nprocs: int,
+                 trials: int, warmup: int, out_dir: str) -> Dict[str, Any]:
+    """Time one (size, nprocs) configuration: warmup runs are discarded, then `trials` runs are summarized.
+
+    Wall time excludes interpreter startup (the simulator is called in-process). When the runner
+    supports timings=True, simulation and output time are also reported separately.
+    """
+    params = inspect.signature(runner).parameters
+    has_spans = "timings" in params
+    kwargs: Dict[str, Any] = {"size": size, "steps": steps,
+                              "fName": os.path.join(out_dir, f"bench_{size}_{steps}_{nprocs}.txt")}
+    if "nprocs_opt" in params:
+        kwargs["nprocs_opt"] = nprocs
+    if has_spans:
+        kwargs["timings"] = True
+    wall, sim, io = [], [], []
+    for trial in range(warmup + trials):
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            t0 = time.perf_counter()
+            spans = runner(initF, **kwargs)
+            dt = time.perf_counter() - t0
+        if trial < warmup:
+            continue
+        wall.append(dt)
+        if has_spans:
+            s, o = split_spans(spans[0])
+            sim.append(s)
+            io.append(o)
+    result = {"size": size, "steps": steps, "nprocs": nprocs, "wall": summarize(wall)}
+    if has_spans:
+        result["sim"] = summarize(sim)
+        result["io"] = summarize(io)
+    return result
+
+
+def print_bench_row(label: str, res: Dict[str, Any], base: Optional[Dict[str, Any]]):
+    wall = res["wall"]
+    line = f"{label}: wall median={wall['median']:.3f}s iqr={wall['iqr']:.3f}s"
+    if "sim" in res:
+        line += f"; sim={res['sim']['median']:.3f}s io={res['io']['median']:.3f}s"
+    if base is not None:
+        key = "sim" if "sim" in res else "wall"
+        ratio = base[key]["median"] / res[key]["median"] if res[key]["median"] > 0 else float("inf")
+        line += f"; {'speedup' if res['size'] == base['size'] else 'efficiency'}={ratio:.2f}"
+    print(line)
+
+
+def run_benchmarks(args, par_path: str, seq_path: str) -> Dict[str, Any]:
+    """Strong scaling (fixed grid) and weak scaling (fixed cells per process) for the parallel simulator."""
+    cpu_ct = os.cpu_count() or 1
+    par = load_module(par_path)
+    backend = args.bench_backend
+    runner = par.run_sim_haloThreads if backend == "threads" else par.run_sim_haloMP
+    initF = getattr(par, f"initializeActionGrid{args.bench_init}")
+    steps = int(args.steps)
+    requested = [int(x) for x in args.bench_nprocs.split(",")]
+    nprocs_list = []
+    for r in requested:
+        n = cap_nprocs(r, args.bench_size, cpu_ct)
+        if n not in nprocs_list:
+            nprocs_list.append(n)
+
+    results: Dict[str, Any] = {
+        "meta": {"python": platform.python_version(), "platform": platform.platform(), "cpu_count": cpu_ct,
+                 "backend": backend, "init": args.bench_init, "steps": steps,
+                 "trials": args.trials, "warmup": args.warmup},
+        "strong": [], "weak": [],
+    }
+
+    with tempfile.TemporaryDirectory() as out_dir:
+        if args.bench_seq:
+            seq = load_module(seq_path)
+            seq_init = getattr(seq, f"initializeActionGrid{args.bench_init}")
+            print_header(f"Sequential: {args.bench_size}x{args.bench_size}, steps={steps}")
+            res = bench_config(seq.runSimulation, seq_init, args.bench_size, steps, 1,
+                               args.trials, args.warmup, out_dir)
+            print_bench_row("sequential", res, None)
+            results["sequential"] = res
+
+        size = args.bench_size
+        print_header(f"Strong scaling ({backend}): {size}x{size}, steps={steps}, nprocs in {nprocs_list}")
+        base = None
+        for n in nprocs_list:
+            res = bench_config(runner, initF, size, steps, n, args.trials, args.warmup, out_dir)
+            base = base or res
+            print_bench_row(f"nprocs={n}", res, base)
+            results["strong"].append(res)
+
+        print_header(f"Weak scaling ({backend}): {args.weak_base}^2 cells per process, steps={steps}")
+        base = None
+        for n in nprocs_list:
+            size = max(1, round(args.weak_base * math.sqrt(n)))
+            res = bench_config(runner, initF, size, steps, n, args.trials, args.warmup, out_dir)
+            base = base or res
+            print_bench_row(f"nprocs={n} size={size}", res, base)
+            results["weak"].append(res)
+
+    return results
+
+
+def compare_to_baseline(results: Dict[str, Any], baseline_path: str, threshold: float) -> bool:
+    """Print median ratios against a stored run; True if nothing regressed by more than threshold."""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    print_header(f"Compared to baseline {baseline_path}")
+    ok = True
+    for kind in ("strong", "weak"):
+        old = {(r["size"], r["nprocs"]): r for r in baseline.get(kind, [])}
+        for res in results[kind]:
+            prev = old.get((res["size"], res["nprocs"]))
+            if prev is None:
+                continue
+            key = "sim" if "sim" in res and "sim" in prev else "wall"
+            new_med, old_med = res[key]["median"], prev[key]["median"]
+            change = (new_med - old_med) / old_med if old_med > 0 else 0.0
+            # only call it a regression when the shift is also outside the old run's spread
+            regressed = change > threshold and new_med > prev[key]["q3"]
+            ok = ok and not regressed
+            print(f"{kind} size={res['size']} nprocs={res['nprocs']}: {key} {old_med:.3f}s -> {new_med:.3f}s "
+                  f"({change:+.1%}){' REGRESSION' if regressed else ''}")
+    return ok
+
 
 def main():
     parser = argparse.ArgumentParser(description="Run correctness and performance tests for Assignment 3.")
@@ -103,6 +385,21 @@ def main():
     parser.add_argument("--full", action="store_true", help="Run full suite (includes 1024x1024 correctness, speedups, and alt-size)")
     parser.add_argument("--quick", action="store_true", help="Run only quick correctness (10x10 with 2 and 4 procs)")
     parser.add_argument("--alt-size", type=int, default=256, help="Alternate grid size for extra correctness test (default: 256)")
+    parser.add_argument("--jobs", type=int, default=0, help="CPU budget for running configurations concurrently (default: cpu_count)")
+    parser.add_argument("--cache", default=".seq_cache.json", help="File caching sequential reference digests (default: .seq_cache.json)")
+    parser.add_argument("--no-cache", action="store_true", help="Always rerun the sequential references")
+    parser.add_argument("--bench", action="store_true", help="Run the scaling benchmark instead of the correctness suites")
+    parser.add_argument("--trials", type=int, default=5, help="Timed trials per benchmark configuration (default: 5)")
+    parser.add_argument("--warmup", type=int, default=1, help="Untimed warmup runs per benchmark configuration (default: 1)")
+    parser.add_argument("--bench-nprocs", default="1,2,4,8,16", help="Comma-separated nprocs for scaling runs (default: 1,2,4,8,16)")
+    parser.add_argument("--bench-size", type=int, default=256, help="Grid size for strong scaling (default: 256)")
+    parser.add_argument("--weak-base", type=int, default=128, help="Grid size at nprocs=1 for weak scaling, grows with sqrt(nprocs) (default: 128)")
+    parser.add_argument("--bench-init", type=int, choices=(1, 2, 3, 4), default=1, help="Initializer to benchmark (default: 1)")
+    parser.add_argument("--bench-backend", choices=("mp", "threads"), default="mp", help="Parallel backend to benchmark (default: mp)")
+    parser.add_argument("--bench-seq", action="store_true", help="Also time the sequential version at --bench-size")
+    parser.add_argument("--bench-out", default="bench_results.json", help="Where to save benchmark JSON (default: bench_results.json)")
+    parser.add_argument("--baseline", help="Benchmark JSON from an earlier run to compare against")
+    parser.add_argument("--regress-threshold", type=float, default=0.10, help="Relative slowdown that counts as a regression (default: 0.10)")
     args = parser.parse_args()
 
     # Default behavior: quick unless --full is provided
@@ -119,6 +416,16 @@ def main():
         print(f"error: sequential file not found: {seq_path}", file=sys.stderr)
         sys.exit(2)
 
+    if args.bench:
+        print(f"cpu_count: {os.cpu_count() or 1}")
+        results = run_benchmarks(args, par_path, seq_path)
+        with open(args.bench_out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nresults saved to {args.bench_out}")
+        if args.baseline and not compare_to_baseline(results, args.baseline, args.regress_threshold):
+            sys.exit(1)
+        return
+
     steps = int(args.steps)
     cpu_ct = os.cpu_count() or 1
     print(f"cpu_count: {cpu_ct}")
@@ -132,86 +439,74 @@ def main():
         for m in header_msgs:
             print(f" - {m}")
 
+    alt = int(args.alt_size)
+    full_size = 1024
+
+    # Collect every run the selected suites need and start them together, independent runs overlap
+    seq_sizes: List[int] = []
+    par_configs: List[Tuple[int, int]] = []
+    if quick:
+        seq_sizes.append(10)
+        par_configs += [(10, cap_nprocs(r, 10, cpu_ct)) for r in (2, 4, 8)]
+    if args.full:
+        seq_sizes += [full_size, alt]
+        par_configs += [(full_size, cap_nprocs(r, full_size, cpu_ct)) for r in (2, 4, 8, 1, 16)]
+        par_configs += [(alt, cap_nprocs(r, alt, cpu_ct)) for r in (2, 4, 8)]
+    jobs = args.jobs or cpu_ct
+    cache = SeqCache(None if args.no_cache else args.cache, seq_path)
+    print(f"running {len(set(seq_sizes)) + len(set(par_configs))} configurations, cpu budget={jobs}")
+    seq_results, par_results = run_all(seq_path, par_path, steps, seq_sizes, par_configs, cache, jobs)
+
     # Quick suite: 10x10 correctness for nprocs 2 and 4
     if quick:
         size = 10
         print_header(f"Correctness: {size}x{size}, steps={steps}, nprocs=2 and 4 and 8")
-        # Run sequential once
-        try:
-            t_seq_10, seq_out_10 = run_seq(seq_path, size, steps)
-        except Exception as e:
-            print(str(e), file=sys.stderr)
-            sys.exit(1)
+        _, seq_out_10, _ = result_or_exit(seq_results[size])
 
         for req_n in (2, 4, 8):
-            n = cap_nprocs(req_n, size, os.cpu_count() or 1)
+            n = cap_nprocs(req_n, size, cpu_ct)
             print(f"running parallel: requested={req_n}, effective={n} (cpu_count={cpu_ct})")
-            try:
-                t_par, par_out = run_par(par_path, size, steps, n)
-            except Exception as e:
-                print(str(e), file=sys.stderr)
-                sys.exit(1)
+            t_par, par_out = result_or_exit(par_results[(size, n)])
             per_init, overall = compare_outputs(seq_out_10, par_out)
-            print(f"nprocs={n}: overall={'PASS' if overall else 'FAIL'}; details="
-                  f"init1={'ok' if per_init[1] else 'x'}, init2={'ok' if per_init[2] else 'x'}, "
-                  f"init3={'ok' if per_init[3] else 'x'}, init4={'ok' if per_init[4] else 'x'}")
+            print(f"nprocs={n}: overall={'PASS' if overall else 'FAIL'}; details={format_details(per_init)}")
 
     # Full suite: 1024x1024 correctness and speedups
     if args.full:
-        size = 1024
+        size = full_size
         print_header(f"Correctness: {size}x{size}, steps={steps}, nprocs=2 and 4")
+        if jobs > 1:
+            print(f"note: runs overlapped within a {jobs} cpu budget, use --jobs 1 for isolated timings")
 
         # Baseline sequential
-        try:
-            t_seq_1024, seq_out_1024 = run_seq(seq_path, size, steps)
-        except Exception as e:
-            print(str(e), file=sys.stderr)
-            sys.exit(1)
-        print(f"sequential time: {t_seq_1024:.3f}s")
+        t_seq_1024, seq_out_1024, cached = result_or_exit(seq_results[size])
+        print(f"sequential time: {t_seq_1024:.3f}s{' (cached)' if cached else ''}")
 
         # Correctness and performance for nprocs 2 and 4
         speedups: Dict[int, float] = {}
         for req_n in (2, 4, 8):
-            n = cap_nprocs(req_n, size, os.cpu_count() or 1)
+            n = cap_nprocs(req_n, size, cpu_ct)
             print(f"running parallel: requested={req_n}, effective={n}, (cpu_count={cpu_ct})")
-            try:
-                t_par, par_out = run_par(par_path, size, steps, n)
-            except Exception as e:
-                print(str(e), file=sys.stderr)
-                sys.exit(1)
+            t_par, par_out = result_or_exit(par_results[(size, n)])
             per_init, overall = compare_outputs(seq_out_1024, par_out)
             sp = (t_seq_1024 / t_par) if t_par > 0 else float('inf')
             speedups[n] = sp
             print(f"parallel time (nprocs={n}): {t_par:.3f}s")
-            print(f"nprocs={n}: overall={'PASS' if overall else 'FAIL'}; speedup={sp:.2f}x; details="
-                  f"init1={'ok' if per_init[1] else 'x'}, init2={'ok' if per_init[2] else 'x'}, "
-                  f"init3={'ok' if per_init[3] else 'x'}, init4={'ok' if per_init[4] else 'x'}")
+            print(f"nprocs={n}: overall={'PASS' if overall else 'FAIL'}; speedup={sp:.2f}x; "
+                  f"details={format_details(per_init)}")
 
         # Additional speedups for nprocs in {1,2,4,8,16}
         print_header(f"Speedups: {size}x{size}, steps={steps}, nprocs in [1,2,4,8,16]")
-        requested = [1, 2, 4, 8, 16]
-        effective = []
-        for r in requested:
-            n = cap_nprocs(r, size, os.cpu_count() or 1)
-            if n not in effective:
-                effective.append(n)
-
-        # We already measured 2 and 4 above if effective included them
-        for n in effective:
+        for r in (1, 2, 4, 8, 16):
+            n = cap_nprocs(r, size, cpu_ct)
             if n in speedups:
                 continue
-            try:
-                t_par, _ = run_par(par_path, size, steps, n)
-            except Exception as e:
-                print(str(e), file=sys.stderr)
-                sys.exit(1)
-            sp = (t_seq_1024 / t_par) if t_par > 0 else float('inf')
-            speedups[n] = sp
+            t_par, _ = result_or_exit(par_results[(size, n)])
+            speedups[n] = (t_seq_1024 / t_par) if t_par > 0 else float('inf')
 
         # Summarize speedup checks
         # 20% speedup for nprocs=2 and 4
         for req in (2, 4, 8):
-            n = cap_nprocs(req, size, os.cpu_count() or 1)
+            n = cap_nprocs(req, size, cpu_ct)
             sp = speedups.get(n)
             if sp is None:
                 print(f"nprocs={n}: no measurement available")
@@ -223,24 +518,13 @@ def main():
         print(f"any nprocs >=4.00x: {'PASS' if any_4x else 'FAIL'}")
 
         # Alternate grid size correctness (penalty if fails)
-        alt = int(args.alt_size)
         print_header(f"Alternate Size Correctness: {alt}x{alt}, steps={steps}, nprocs=2 and 4")
-        try:
-            t_seq_alt, seq_out_alt = run_seq(seq_path, alt, steps)
-        except Exception as e:
-            print(str(e), file=sys.stderr)
-            sys.exit(1)
+        _, seq_out_alt, _ = result_or_exit(seq_results[alt])
         for req_n in (2, 4, 8):
-            n = cap_nprocs(req_n, alt, os.cpu_count() or 1)
-            try:
-                t_par, par_out = run_par(par_path, alt, steps, n)
-            except Exception as e:
-                print(str(e), file=sys.stderr)
-                sys.exit(1)
+            n = cap_nprocs(req_n, alt, cpu_ct)
+            t_par, par_out = result_or_exit(par_results[(alt, n)])
             per_init, overall = compare_outputs(seq_out_alt, par_out)
-            print(f"nprocs={n}: overall={'PASS' if overall else 'FAIL'}; details="
-                  f"init1={'ok' if per_init[1] else 'x'}, init2={'ok' if per_init[2] else 'x'}, "
-                  f"init3={'ok' if per_init[3] else 'x'}, init4={'ok' if per_init[4] else 'x'}")
+            print(f"nprocs={n}: overall={'PASS' if overall else 'FAIL'}; details={format_details(per_init)}")
 
     print("\nDone.")
 
@@ -9,8 +9,19 @@ All work below was performed solely by (Your Name).
 I [did not use | used] code generated by an AI tool.
 """
 
+import os
 import sys
+import json
+import math
+import hashlib
+import inspect
+import functools
+import statistics
+import importlib.util
+import importlib.metadata
+import argparse
 import random
+import multiprocessing as mp
 
 # --- CONSTANTS ---
 defect = 0
@@ -132,12 +143,95 @@ def strategy_JamesCReed(p1_history, p2_history):
         return cooperate
     
     # last 3 values all defect then defect
-    if len(p2_history) >= 3 and p2_history[-3:] == [defect, defect, defect]:
+    if len(p2_history) >= 3 and p2_history[-1] == p2_history[-2] == p2_history[-3] == defect:
         return defect
     
     # regular return previous choice
     return p2_history[-1]
 
+# --- State machines ---
+class Machine:
+    """a strategy written as a state machine over the match so far. move(state) is this
+    round's choice and advance(state, my_choice, opp_choice) is the state for the next round,
+    so each round costs O(1) no matter how long the match is. finite machines only ever reach
+    a bounded set of hashable states. random machines get start(rng) as their start state"""
+    def __init__(self, start, move, advance, finite=True, deterministic=True):
+        self.start = start
+        self.move = move
+        self.advance = advance
+        self.finite = finite and deterministic
+        self.deterministic = deterministic
+
+    def initial_state(self, rng):
+        return self.start if self.deterministic else self.start(rng)
+
+def same_state(state, my_choice, opp_choice):
+    return state
+
+def probAndLock_move(state):
+    round_num, reward20, reward40 = state
+    if round_num < 20:
+        return defect
+    if round_num < 40:
+        return cooperate
+    return defect if reward20 > reward40 else cooperate
+
+def probAndLock_advance(state, my_choice, opp_choice):
+    round_num, reward20, reward40 = state
+    if round_num >= 40:
+        return state
+    reward, _ = get_reward_values(my_choice, opp_choice)
+    # same rounds that rangeReward(0, 20) and rangeReward(20, 40) add up
+    if round_num < 19:
+        reward20 += reward
+    elif 20 <= round_num < 39:
+        reward40 += reward
+    return (round_num + 1, reward20, reward40)
+
+def continuousProbe_move(state):
+    round_num, cooperate_reward, defect_reward = state
+    if round_num == 0:
+        return defect
+    if round_num == 1:
+        return cooperate
+    return cooperate if cooperate_reward > defect_reward else defect
+
+def continuousProbe_advance(state, my_choice, opp_choice):
+    # running reward totals per action instead of rescanning the history
+    round_num, cooperate_reward, defect_reward = state
+    reward, _ = get_reward_values(my_choice, opp_choice)
+    if my_choice == cooperate:
+        cooperate_reward += reward
+    else:
+        defect_reward += reward
+    return (min(round_num + 1, 2), cooperate_reward, defect_reward)
+
+def JamesCReed_move(last3):
+    if len(last3) == 0:
+        return cooperate
+    if last3 == (defect, defect, defect):
+        return defect
+    return last3[-1]
+
+def JamesCReed_advance(last3, my_choice, opp_choice):
+    return (last3 + (opp_choice,))[-3:]
+
+strategy_alwaysCooperate.machine = Machine(None, lambda s: cooperate, same_state)
+strategy_alwaysDefect.machine = Machine(None, lambda s: defect, same_state)
+strategy_probAndLock.machine = Machine((0, 0, 0), probAndLock_move, probAndLock_advance)
+# the reward totals grow without bound so this one is stepped round by round
+strategy_continuousProbe.machine = Machine((0, 0, 0), continuousProbe_move, continuousProbe_advance, finite=False)
+strategy_defectUntilCooperate.machine = Machine(
+    False, lambda seen: cooperate if seen else defect,
+    lambda seen, my_choice, opp_choice: seen or opp_choice == cooperate)
+# strategy_opponentCooperatePercentage returns before it counts anything, so these always defect
+strategy_opponentCooperate10Percentage.machine = strategy_alwaysDefect.machine
+strategy_opponentCooperate50Percentage.machine = strategy_alwaysDefect.machine
+strategy_opponentCooperate90Percentage.machine = strategy_alwaysDefect.machine
+strategy_random50.machine = Machine(lambda rng: rng, lambda rng: rng.choice([cooperate, defect]), same_state,
+                                     deterministic=False)
+strategy_JamesCReed.machine = Machine((), JamesCReed_move, JamesCReed_advance)
+
 # A list of all strategy functions.
 strategies = [
     strategy_alwaysCooperate,
@@ -152,37 +246,470 @@ strategies = [
     strategy_JamesCReed
 ]
 
-def main(num_of_iterations, num_of_strategies):
-    """Main Game Loop"""
-    print(f"num_of_iterations = {num_of_iterations}, num_of_strategies = {num_of_strategies}\n")
+# --- Strategy registry ---
+STRATEGY_GROUP = "cooperation_game.strategies"
+STRATEGY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "strategies")
 
-    scoreboard = [0] * num_of_strategies
+def memory_machine(strategy, depth):
+    """a machine for a deterministic history function that only looks at the last depth
+    rounds. the state is just those rounds so it's finite and gets the cycle detection"""
+    def move(state):
+        return strategy(bytes(state[0]), bytes(state[1]))
+
+    def advance(state, my_choice, opp_choice):
+        mine, theirs = state[0] + (my_choice,), state[1] + (opp_choice,)
+        return mine[max(0, len(mine) - depth):], theirs[max(0, len(theirs) - depth):]
+    return Machine(((), ()), move, advance)
+
+def prepare_strategy(strategy, module=None):
+    """fills in the deterministic and memory metadata from the function or its module and
+    gives deterministic strategies with a memory depth a machine"""
+    for key, default in (("deterministic", False), ("memory", None)):
+        if not hasattr(strategy, key):
+            setattr(strategy, key, getattr(module, key, default))
+    if getattr(strategy, "machine", None) is None and strategy.deterministic and strategy.memory is not None:
+        strategy.machine = memory_machine(strategy, strategy.memory)
+    return strategy
+
+def load_file_strategy(path, name):
+    """imports strategies/<name>.py and returns its strategy_<name>"""
+    spec = importlib.util.spec_from_file_location(f"cooperation_strategies.{name}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return prepare_strategy(getattr(module, f"strategy_{name}"), module)
+
+def load_entry_point(entry_point):
+    strategy = entry_point.load()
+    return prepare_strategy(strategy, sys.modules.get(strategy.__module__))
+
+class StrategyRegistry:
+    """strategy name -> loader. names come from the built-ins, file names in strategy
+    directories and entry point names, so nothing is imported until it's selected"""
+    def __init__(self):
+        self.loaders = {}
+        self.loaded = {}
+
+    def register(self, name, loader):
+        # first one wins, so a plugin can't shadow a built-in
+        self.loaders.setdefault(name, loader)
+
+    def add_builtin(self, strategy):
+        name = strategy.__name__.replace('strategy_', '')
+        self.loaded[name] = strategy
+        self.register(name, lambda: strategy)
+
+    def discover_directory(self, path):
+        if not os.path.isdir(path):
+            return
+        for entry in sorted(os.listdir(path)):
+            name, ext = os.path.splitext(entry)
+            if ext == ".py" and not name.startswith("_"):
+                self.register(name, functools.partial(load_file_strategy, os.path.join(path, entry), name))
+
+    def discover_entry_points(self, group=STRATEGY_GROUP):
+        for entry_point in importlib.metadata.entry_points(group=group):
+            self.register(entry_point.name, functools.partial(load_entry_point, entry_point))
+
+    def names(self):
+        return list(self.loaders)
+
+    def load(self, name):
+        if name not in self.loaded:
+            if name not in self.loaders:
+                raise KeyError(f"unknown strategy {name}")
+            self.loaded[name] = self.loaders[name]()
+        return self.loaded[name]
+
+registry = StrategyRegistry()
+for s in strategies:
+    registry.add_builtin(s)
+
+# (names, strategy dirs) once use_strategies has picked the lineup, pool workers redo it
+lineup = None
+
+def discover(strategy_dirs=()):
+    for path in strategy_dirs:
+        registry.discover_directory(path)
+    registry.discover_entry_points()
+
+def use_strategies(names, strategy_dirs=()):
+    """replaces the contents of strategies with the named ones, importing only those"""
+    global lineup
+    discover(strategy_dirs)
+    strategies[:] = [registry.load(name) for name in names]
+    lineup = (list(names), list(strategy_dirs))
+
+def make_pool(processes):
+    if lineup is None:
+        return mp.Pool(processes)
+    return mp.Pool(processes, initializer=use_strategies, initargs=lineup)
+
+# --- Match engines ---
+def play_functions(p1_strategy, p2_strategy, num_of_iterations):
+    """plays a match by calling the strategy functions with the full histories each round.
+    the moves live in bytearrays sized for the whole match and strategies get read only
+    memoryviews of the rounds played so far, which index like lists without copying them.
+    they aren't lists though, a slice compares equal to bytes and never to a list"""
+    # track each players history and score 
+    p1_score, p1_moves = 0, bytearray(num_of_iterations)
+    p2_score, p2_moves = 0, bytearray(num_of_iterations)
+    p1_view, p2_view = memoryview(p1_moves).toreadonly(), memoryview(p2_moves).toreadonly()
+
+    for i in range(num_of_iterations):
+        p1_history, p2_history = p1_view[:i], p2_view[:i]
+
+        # choice -> reward -> score -> tracker
+        p1_choice = p1_strategy(p1_history, p2_history)
+        p2_choice = p2_strategy(p2_history, p1_history)
+
+        reward_tuple = get_reward_values(p1_choice, p2_choice)
+
+        p1_score += reward_tuple[0]
+        p2_score += reward_tuple[1]
+
+        p1_moves[i] = p1_choice
+        p2_moves[i] = p2_choice
+
+    return p1_score, p2_score
+
+def play_machines(m1, m2, num_of_iterations, rng=random):
+    """plays a match between two machines. when both are finite the pair of states has to
+    repeat eventually and from there the match is periodic, so the rest of the rounds are
+    added a whole cycle at a time and the cost doesn't grow with num_of_iterations"""
+    s1, s2 = m1.initial_state(rng), m2.initial_state(rng)
+    p1_score, p2_score = 0, 0
+    detect = m1.finite and m2.finite
+    seen = {}   # (s1, s2) -> (round, p1_score, p2_score) when it was first reached
+
+    i = 0
+    while i < num_of_iterations:
+        if detect:
+            key = (s1, s2)
+            if key in seen:
+                start, start1, start2 = seen[key]
+                period = i - start
+                cycles = (num_of_iterations - i) // period
+                p1_score += cycles * (p1_score - start1)
+                p2_score += cycles * (p2_score - start2)
+                i += cycles * period
+                # less than one period left, play it out
+                detect = False
+                continue
+            seen[key] = (i, p1_score, p2_score)
 
-    for p1 in range(num_of_strategies):
-        # start after p1 till the num of strats 
-        for p2 in range(p1 + 1, num_of_strategies):
-            # track each players history and score 
-            p1_score, p1_history, p2_score, p2_history = 0, [], 0, []
+        p1_choice, p2_choice = m1.move(s1), m2.move(s2)
+        reward_tuple = get_reward_values(p1_choice, p2_choice)
+        p1_score += reward_tuple[0]
+        p2_score += reward_tuple[1]
+        s1 = m1.advance(s1, p1_choice, p2_choice)
+        s2 = m2.advance(s2, p2_choice, p1_choice)
+        i += 1
 
-            # get strategy function names from strategies array
-            p1_strategy, p2_strategy = strategies[p1], strategies[p2]
+    return p1_score, p2_score
 
-            for i in range(num_of_iterations):
-                # choice -> reward -> score -> tracker
-                p1_choice = p1_strategy(p1_history, p2_history)
-                p2_choice = p2_strategy(p2_history, p1_history)
+def next_tremble(rng, noise):
+    """rounds until a player's next mistake. the gaps between independent flips with
+    probability noise are geometric, so one draw covers a whole run of clean rounds
+    instead of drawing every round"""
+    if noise <= 0:
+        return math.inf
+    if noise >= 1:
+        return 0
+    return int(math.log(1.0 - rng.random()) / math.log(1.0 - noise))
 
-                reward_tuple = get_reward_values(p1_choice, p2_choice)
+def play_noisy(m1, m2, num_of_iterations, noise, rng):
+    """plays a match where each move comes out as the opposite of what the strategy chose
+    with probability noise. both sides see the moves that were actually played"""
+    s1, s2 = m1.initial_state(rng), m2.initial_state(rng)
+    p1_score, p2_score = 0, 0
+    flip1, flip2 = next_tremble(rng, noise), next_tremble(rng, noise)
 
-                p1_score += reward_tuple[0]
-                p2_score += reward_tuple[1]
+    for i in range(num_of_iterations):
+        p1_choice, p2_choice = m1.move(s1), m2.move(s2)
+        if i == flip1:
+            p1_choice = 1 - p1_choice
+            flip1 = i + 1 + next_tremble(rng, noise)
+        if i == flip2:
+            p2_choice = 1 - p2_choice
+            flip2 = i + 1 + next_tremble(rng, noise)
+        reward_tuple = get_reward_values(p1_choice, p2_choice)
+        p1_score += reward_tuple[0]
+        p2_score += reward_tuple[1]
+        s1 = m1.advance(s1, p1_choice, p2_choice)
+        s2 = m2.advance(s2, p2_choice, p1_choice)
 
-                p1_history.append(p1_choice)
-                p2_history.append(p2_choice)
+    return p1_score, p2_score
 
-            # scoreboard
-            scoreboard[p1] += p1_score
-            scoreboard[p2] += p2_score
+def play_match(p1_strategy, p2_strategy, num_of_iterations, rng=random):
+    """uses the machines when both strategies have one, the history functions otherwise.
+    the history functions always draw from the global random module"""
+    m1 = getattr(p1_strategy, "machine", None)
+    m2 = getattr(p2_strategy, "machine", None)
+    if m1 is not None and m2 is not None:
+        return play_machines(m1, m2, num_of_iterations, rng)
+    return play_functions(p1_strategy, p2_strategy, num_of_iterations)
+
+def match_rng(seed, p1, p2):
+    """the rng for one match depends only on the seed and the pair, not on which worker
+    plays it or in what order, so a seeded tournament gives the same scores every run"""
+    return random.Random(f"{seed}:{p1}:{p2}")
+
+def play_pair(job):
+    """pool worker: plays strategies[p1] against strategies[p2]"""
+    p1, p2, num_of_iterations, seed = job
+    rng = random if seed is None else match_rng(seed, p1, p2)
+    p1_score, p2_score = play_match(strategies[p1], strategies[p2], num_of_iterations, rng)
+    return p1, p2, p1_score, p2_score
+
+def play_replications(job):
+    """pool worker: replications [r_lo, r_hi) of the noisy match strategies[p1] vs strategies[p2],
+    each with its own rng so the numbers don't depend on how the work was split"""
+    p1, p2, num_of_iterations, seed, noise, r_lo, r_hi = job
+    m1, m2 = strategies[p1].machine, strategies[p2].machine
+    scores = [play_noisy(m1, m2, num_of_iterations, noise, random.Random(f"{seed}:{p1}:{p2}:{r}"))
+              for r in range(r_lo, r_hi)]
+    return p1, p2, r_lo, scores
+
+def source_closure(*funcs):
+    """source of funcs and of every module level function they call, directly or not, so
+    editing a helper like rangeReward changes the hash too"""
+    seen, sources, todo = set(), [], list(funcs)
+    while todo:
+        func = todo.pop()
+        if func in seen:
+            continue
+        seen.add(func)
+        try:
+            sources.append(inspect.getsource(func))
+        except (OSError, TypeError):
+            continue
+        codes = [func.__code__]
+        while codes:
+            code = codes.pop()
+            for name in code.co_names:
+                called = func.__globals__.get(name)
+                if inspect.isfunction(called):
+                    todo.append(called)
+            codes += [c for c in code.co_consts if inspect.iscode(c)]
+    return sources
+
+def strategy_hash(strategy):
+    """hash of everything a match result depends on for this strategy: its function and
+    metadata, its machine, the helpers they call, the match engine and the reward table"""
+    parts = [repr(REWARDAMOUNTS), repr(getattr(strategy, "deterministic", False)),
+             repr(getattr(strategy, "memory", None))]
+    funcs = [strategy, play_match]
+    machine = getattr(strategy, "machine", None)
+    if machine is not None:
+        # memory_machine's depth lives in a closure, the memory repr above covers it
+        parts += [repr(machine.start), repr(machine.deterministic)]
+        funcs += [machine.move, machine.advance]
+    parts += source_closure(*funcs)
+    return hashlib.sha256("\n".join(parts).encode()).hexdigest()[:16]
+
+def is_deterministic(strategy):
+    """strategies with a deterministic machine, or history functions marked deterministic"""
+    machine = getattr(strategy, "machine", None)
+    if machine is not None:
+        return machine.deterministic
+    return getattr(strategy, "deterministic", False)
+
+# next to the script rather than wherever it's run from
+CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".match_cache.json")
+
+class MatchCache:
+    """match results for deterministic pairs stored on disk, keyed by both strategies'
+    source hashes and the number of iterations, so changing a strategy only replays its
+    own matches"""
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self.dirty = False
+        self.hashes = {}
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError):
+                self.entries = {}
+
+    def key(self, p1, p2, num_of_iterations):
+        for s in (p1, p2):
+            if s not in self.hashes:
+                self.hashes[s] = strategy_hash(strategies[s])
+        return f"{self.hashes[p1]}:{self.hashes[p2]}:{num_of_iterations}"
+
+    def get(self, p1, p2, num_of_iterations):
+        if not (is_deterministic(strategies[p1]) and is_deterministic(strategies[p2])):
+            return None
+        return self.entries.get(self.key(p1, p2, num_of_iterations))
+
+    def put(self, p1, p2, num_of_iterations, p1_score, p2_score):
+        if is_deterministic(strategies[p1]) and is_deterministic(strategies[p2]):
+            self.entries[self.key(p1, p2, num_of_iterations)] = [p1_score, p2_score]
+            self.dirty = True
+
+    def save(self):
+        if self.dirty:
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump(self.entries, f, indent=2)
+            self.dirty = False
+
+def play_pairs(pairs, num_of_iterations, workers=1, seed=None, cache=None):
+    """plays every (p1, p2) in pairs, over a process pool when workers > 1, and returns
+    the (p1, p2, p1_score, p2_score) results in no particular order. pairs already in
+    the cache aren't played again"""
+    results, jobs = [], []
+    for p1, p2 in pairs:
+        hit = cache.get(p1, p2, num_of_iterations) if cache else None
+        if hit is not None:
+            results.append((p1, p2, hit[0], hit[1]))
+        else:
+            jobs.append((p1, p2, num_of_iterations, seed))
+
+    if workers > 1 and len(jobs) > 1:
+        with make_pool(min(workers, len(jobs))) as pool:
+            played = list(pool.imap_unordered(play_pair, jobs))
+    else:
+        played = list(map(play_pair, jobs))
+
+    if cache:
+        for p1, p2, p1_score, p2_score in played:
+            cache.put(p1, p2, num_of_iterations, p1_score, p2_score)
+        cache.save()
+    return results + played
+
+def payoff_matrix(num_of_strategies, num_of_iterations, workers=1, seed=None, cache=None):
+    """payoff[i][j] is what strategy i scores in a match against j, self play included.
+    each pair is played once and fills both sides of the matrix"""
+    pairs = [(i, j) for i in range(num_of_strategies) for j in range(i, num_of_strategies)]
+    payoff = [[0] * num_of_strategies for _ in range(num_of_strategies)]
+    for i, j, i_score, j_score in play_pairs(pairs, num_of_iterations, workers, seed, cache):
+        payoff[i][j] = i_score
+        payoff[j][i] = j_score
+    return payoff
+
+def replicator_step(payoff, shares):
+    """one generation of discrete replicator dynamics: a strategy's share grows by its
+    fitness against the current population relative to the population average"""
+    k = len(shares)
+    fitness = [sum(payoff[i][j] * shares[j] for j in range(k)) for i in range(k)]
+    average = sum(fitness[i] * shares[i] for i in range(k))
+    if average == 0:
+        return shares
+    return [shares[i] * fitness[i] / average for i in range(k)]
+
+def moran_generation(payoff, counts, rng):
+    """one generation (population size steps) of the Moran process: an individual picked
+    in proportion to its fitness reproduces and replaces one picked uniformly at random.
+    fitness is the average payoff against everyone else in the population"""
+    k = len(counts)
+    population = sum(counts)
+    # payoff against the whole population, kept up to date as counts change so a step is O(k)
+    against = [sum(payoff[i][j] * counts[j] for j in range(k)) for i in range(k)]
+    for _ in range(population):
+        fitness = [counts[i] * (against[i] - payoff[i][i]) for i in range(k)]
+        if sum(fitness) == 0:
+            fitness = counts
+        born = rng.choices(range(k), weights=fitness)[0]
+        died = rng.choices(range(k), weights=counts)[0]
+        if born == died:
+            continue
+        counts[born] += 1
+        counts[died] -= 1
+        for i in range(k):
+            against[i] += payoff[i][born] - payoff[i][died]
+        if counts[born] == population:
+            break
+    return counts
+
+def evolve(num_of_iterations, num_of_strategies, mode, generations, population,
+           workers=1, seed=None, cache=None):
+    """runs the population dynamics on top of a payoff matrix that is only computed once"""
+    print(f"num_of_iterations = {num_of_iterations}, num_of_strategies = {num_of_strategies}, "
+          f"mode = {mode}, generations = {generations}\n")
+
+    if seed is None:
+        seed = random.randrange(2**32)
+        print(f"seed = {seed}\n")
+    payoff = payoff_matrix(num_of_strategies, num_of_iterations, workers, seed, cache)
+
+    if mode == "replicator":
+        shares = [1 / num_of_strategies] * num_of_strategies
+        for _ in range(generations):
+            shares = replicator_step(payoff, shares)
+    else:
+        rng = random.Random(f"{seed}:moran")
+        counts = [population // num_of_strategies] * num_of_strategies
+        for i in range(population % num_of_strategies):
+            counts[i] += 1
+        for gen in range(generations):
+            counts = moran_generation(payoff, counts, rng)
+            if max(counts) == population:
+                print(f"fixation after {gen + 1} generations\n")
+                break
+        shares = [c / population for c in counts]
+
+    for i in range(num_of_strategies):
+        strat_name = strategies[i].__name__.replace('strategy_', '')
+        print(f"{strat_name}: {shares[i]:.4f}")
+
+def monte_carlo(num_of_iterations, num_of_strategies, noise, replications, workers=1, seed=None):
+    """plays the tournament replications times with trembling hands and reports each
+    strategy's mean total score with a 95% confidence interval"""
+    print(f"num_of_iterations = {num_of_iterations}, num_of_strategies = {num_of_strategies}, "
+          f"noise = {noise}, replications = {replications}\n")
+
+    for s in strategies[:num_of_strategies]:
+        if getattr(s, "machine", None) is None:
+            raise ValueError(f"{s.__name__} has no machine, noisy matches need one")
+    if seed is None:
+        seed = random.randrange(2**32)
+        print(f"seed = {seed}\n")
+
+    pairs = [(p1, p2) for p1 in range(num_of_strategies) for p2 in range(p1 + 1, num_of_strategies)]
+    # split the replications so there are a few jobs per worker even with only a few pairs
+    chunk = max(1, min(replications, replications * len(pairs) // (max(workers, 1) * 4)))
+    jobs = [(p1, p2, num_of_iterations, seed, noise, r, min(r + chunk, replications))
+            for p1, p2 in pairs for r in range(0, replications, chunk)]
+
+    if workers > 1 and len(jobs) > 1:
+        with make_pool(min(workers, len(jobs))) as pool:
+            results = list(pool.imap_unordered(play_replications, jobs))
+    else:
+        results = list(map(play_replications, jobs))
+
+    # totals[i][r] is strategy i's tournament score in replication r
+    totals = [[0] * replications for _ in range(num_of_strategies)]
+    for p1, p2, r_lo, scores in results:
+        for r, (p1_score, p2_score) in enumerate(scores, r_lo):
+            totals[p1][r] += p1_score
+            totals[p2][r] += p2_score
+
+    for i in range(num_of_strategies):
+        strat_name = strategies[i].__name__.replace('strategy_', '')
+        mean = statistics.fmean(totals[i])
+        half = 1.96 * statistics.stdev(totals[i]) / math.sqrt(replications) if replications > 1 else 0.0
+        print(f"{strat_name}: {mean:.1f} +/- {half:.1f}")
+
+def main(num_of_iterations, num_of_strategies, workers=1, seed=None, cache=None):
+    """Main Game Loop. with workers > 1 the matches are spread over a process pool, and
+    since every match then needs its own rng a seed is picked if none was given"""
+    print(f"num_of_iterations = {num_of_iterations}, num_of_strategies = {num_of_strategies}\n")
+
+    scoreboard = [0] * num_of_strategies
+
+    if workers > 1 and seed is None:
+        seed = random.randrange(2**32)
+        print(f"seed = {seed}\n")
+
+    # every pair plays once, p2 after p1
+    pairs = [(p1, p2) for p1 in range(num_of_strategies) for p2 in range(p1 + 1, num_of_strategies)]
+
+    # scoreboard, the sums don't depend on the order matches finish in
+    for p1, p2, p1_score, p2_score in play_pairs(pairs, num_of_iterations, workers, seed, cache):
+        scoreboard[p1] += p1_score
+        scoreboard[p2] += p2_score
 
     # display results 
     for i in range(len(scoreboard)):
@@ -190,10 +717,47 @@ def main(num_of_iterations, num_of_strategies):
         print(f"{strat_name}: {scoreboard[i]}")
 
 if __name__ == "__main__":
-    if len(sys.argv) == 3:
-        num_of_iterations = int(sys.argv[1])
-        num_of_strategies = int(sys.argv[2])
-    elif len(sys.argv) == 2:
-        num_of_iterations = int(sys.argv[1])
+    parser = argparse.ArgumentParser(description="iterated prisoner's dilemma tournament")
+    parser.add_argument("iterations", type=int, nargs="?", default=num_of_iterations)
+    parser.add_argument("num_strategies", type=int, nargs="?", default=num_of_strategies)
+    parser.add_argument("workers", type=int, nargs="?", default=1,
+                        help="processes to spread the matches over")
+    parser.add_argument("seed", type=int, nargs="?", default=None,
+                        help="base seed for the per match rngs")
+    parser.add_argument("--evolve", choices=("replicator", "moran"),
+                        help="run population dynamics instead of a single tournament")
+    parser.add_argument("--generations", type=int, default=1000)
+    parser.add_argument("--population", type=int, default=100,
+                        help="population size for the Moran process")
+    parser.add_argument("--noise", type=float,
+                        help="probability each move is flipped, runs the Monte Carlo tournament")
+    parser.add_argument("--replications", type=int, default=100,
+                        help="noisy tournaments to average over")
+    parser.add_argument("--strategies",
+                        help="comma separated strategy names to play instead of the first num_strategies")
+    parser.add_argument("--strategy-dir", action="append", default=[STRATEGY_DIR],
+                        help="directory of <name>.py strategy modules, can be repeated")
+    parser.add_argument("--list-strategies", action="store_true",
+                        help="print the known strategy names without importing them")
+    parser.add_argument("--cache", default=CACHE_PATH,
+                        help="file to keep deterministic match results in")
+    parser.add_argument("--no-cache", action="store_true", help="replay every match")
+    args = parser.parse_intermixed_args()
 
-    main(num_of_iterations, num_of_strategies)
\ No newline at end of file
+    if args.list_strategies:
+        discover(args.strategy_dir)
+        print("\n".join(registry.names()))
+        sys.exit(0)
+    if args.strategies:
+        use_strategies(args.strategies.split(","), args.strategy_dir)
+        args.num_strategies = len(strategies)
+
+    cache = None if args.no_cache else MatchCache(args.cache)
+    if args.noise is not None:
+        monte_carlo(args.iterations, args.num_strategies, args.noise, args.replications,
+                    args.workers, args.seed)
+    elif args.evolve:
+        evolve(args.iterations, args.num_strategies, args.evolve, args.generations,
+               args.population, args.workers, args.seed, cache)
+    else:
+        main(args.iterations, args.num_strategies, args.workers, args.seed, cache)
@@ -0,0 +1,133 @@
+"""
+Contention benchmark for the chat server's shared state. Runs process_cmd directly from N
+threads, each thread driving its own logged in user with a mix of shout and say, and
+reports command and delivery throughput for each thread count.
+
+Every user has the threaded backend's QueuedConn in front of a stand-in socket that counts
+the lines written to it, so commands only queue their output like they do in the server
+and each connection's writer thread does the sends. --send-delay makes each of those
+sends sleep like a slow socket would. Commands shouldn't slow down with it, output that
+doesn't fit in OUTBOX_LIMIT is dropped and counted.
+
+usage: python bench_contention.py [--threads 1,2,4,8] [--users 200] [--seconds 2] [--send-delay 0]
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import threading
+import contextlib
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import reed_j_assignment4 as server
+
+
+class CountingSocket:
+    """takes the place of a client socket, counts the lines instead of sending them. only
+    the connection's writer thread calls sendall, so the count needs no lock"""
+    def __init__(self, delay):
+        self.delay = delay
+        self.delivered = 0
+
+    def sendall(self, data):
+        self.delivered += data.count(b"\n")
+        if self.delay:
+            time.sleep(self.delay)
+
+    def shutdown(self, how):
+        pass
+
+    def close(self):
+        pass
+
+
+def setup(num_users, delay):
+    """registers and logs in num_users users and puts all of them in one room"""
+    conns, logged_in = [], []
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        for i in range(num_users):
+            name = f"bench{i}"
+            server.users[name] = {"password": "pw", "info": "", "online": False}
+            conn = server.QueuedConn(CountingSocket(delay))
+            conns.append(conn)
+            logged_in.append(server.User(name, conn, is_guest=False))
+        server.process_cmd(logged_in[0], "start bench room", 0)
+        room_id = max(server.rooms)
+        for u in logged_in[1:]:
+            server.process_cmd(u, f"join {room_id}", 0)
+    return conns, logged_in, room_id
+
+
+def run(threads, users, conns, room_id, seconds):
+    """each thread alternates shout and say as its own user until time is up"""
+    counts = [0] * threads
+    start = threading.Barrier(threads + 1)
+    stop = threading.Event()
+
+    def worker(i):
+        user = users[i]
+        cmds = (f"shout hello from {i}", f"say {room_id} hi from {i}")
+        start.wait()
+        n = 0
+        while not stop.is_set():
+            server.process_cmd(user, cmds[n & 1], n)
+            n += 1
+        counts[i] = n
+
+    for c in conns:
+        c.sock.delivered = 0
+        c.dropped = 0
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for w in workers:
+        w.start()
+    start.wait()
+    t0 = time.perf_counter()
+    time.sleep(seconds)
+    stop.set()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - t0
+    delivered = sum(c.sock.delivered for c in conns)
+    dropped = sum(c.dropped for c in conns)
+    # let the writers finish so the next run starts from empty queues
+    for c in conns:
+        c.wait_drained()
+    return sum(counts) / elapsed, delivered / elapsed, dropped / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="shout/say throughput against thread count")
+    parser.add_argument("--threads", default="1,2,4,8", help="comma separated thread counts")
+    parser.add_argument("--users", type=int, default=200, help="users online, all in one room")
+    parser.add_argument("--seconds", type=float, default=2.0, help="time per thread count")
+    parser.add_argument("--send-delay", type=float, default=0.0,
+                        help="seconds each socket send sleeps, stands in for a slow client")
+    args = parser.parse_args()
+    thread_counts = [int(t) for t in args.threads.split(",")]
+    if max(thread_counts) > args.users:
+        parser.error("need at least as many users as threads")
+
+    # the server saves to the current directory, keep that out of the way
+    os.chdir(tempfile.mkdtemp(prefix="chat_bench_"))
+    server.persistence = server.WriteBehind()
+    server.persistence.start()
+    # a full queue drops and counts the message instead of disconnecting the user
+    server.OVERFLOW_POLICY = "drop"
+    conns, users, room_id = setup(args.users, args.send_delay)
+
+    print(f"users={args.users} seconds={args.seconds} send_delay={args.send_delay}")
+    print(f"{'threads':>8} {'cmds/s':>12} {'deliveries/s':>14} {'dropped/s':>10} {'speedup':>8}")
+    base = None
+    for threads in thread_counts:
+        cmds, deliveries, dropped = run(threads, users, conns, room_id, args.seconds)
+        base = base or cmds
+        print(f"{threads:>8} {cmds:>12.0f} {deliveries:>14.0f} {dropped:>10.0f} {cmds / base:>8.2f}")
+
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        server.persistence.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,347 @@
+"""
+Load generator for the chat server. Opens many telnet style connections from one asyncio
+loop, logs in registered users (lg0, lg1, ...) and idle guests, puts every user in one of
+the rooms and then runs a random mix of say/shout/tell/join at a target total rate.
+
+Every message carries the time it was sent, so each client that receives it records the
+delivery latency, room history replayed on join is marked by the server and isn't
+counted. At the end it reports commands and deliveries per second, p50/p99/max
+latency and the server's RSS (with --pid, or --spawn to start the server itself). It only
+speaks the protocol, so it works against any backend.
+
+The generator shares the machine with the server, on a small box it can be the bottleneck,
+check that its own CPU isn't pegged before blaming the server.
+
+usage: python loadgen.py <port> [--users 200] [--guests 0] [--rooms 5] [--rate 200]
+                         [--mix say=60,shout=2,tell=28,join=10] [--seconds 10] [--warmup 2]
+                         [--pid PID | --spawn "reactor sqlite"]
+"""
+
+import os
+import re
+import sys
+import time
+import array
+import random
+import shutil
+import signal
+import asyncio
+import argparse
+import tempfile
+import resource
+import subprocess
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SERVER = os.path.join(HERE, "reed_j_assignment4.py")
+MSG_FILES = ("goodbye.txt", "prelogin.txt", "welcome.txt")
+PASSWORD = "pw"
+STAMP = re.compile(rb"@(\d+)")
+# room history replayed on join, old messages rather than deliveries
+HISTORY_PREFIX = b"[history] "
+LINE_LIMIT = 1 << 20
+SETUP_TIMEOUT = 10.0
+PASSWORD_PROMPT = b"Enter your password: "
+
+
+class SetupError(Exception):
+    """the server didn't answer setup the way a chat server with these users would"""
+
+
+class Stats:
+    """counts for the measured window, latencies are kept as ns in a compact array"""
+    def __init__(self):
+        self.measuring = False
+        self.sent = {}
+        self.delivered = 0
+        self.errors = 0
+        self.latencies = array.array("q")
+
+    def command(self, op):
+        if self.measuring:
+            self.sent[op] = self.sent.get(op, 0) + 1
+
+    def received(self, line):
+        if not self.measuring:
+            return
+        if b"Error:" in line:
+            self.errors += 1
+        if line.startswith(HISTORY_PREFIX):
+            return
+        now = time.monotonic_ns()
+        for stamp in STAMP.findall(line):
+            self.delivered += 1
+            self.latencies.append(now - int(stamp))
+
+
+class Client:
+    """one connection. reads every line the server sends and records the stamped ones"""
+    def __init__(self, name, stats):
+        self.name = name
+        self.stats = stats
+        self.reader = None
+        self.writer = None
+        self.room = None
+
+    async def connect(self, host, port, gate):
+        """holds gate until the server has sent its first prompt, which means it really
+        accepted us. the threaded server listens with a backlog of 5 and a burst of connects
+        past that stalls on SYN retransmits"""
+        async with gate:
+            for attempt in range(50):
+                try:
+                    self.reader, self.writer = await asyncio.open_connection(host, port, limit=LINE_LIMIT)
+                    await self.expect("Enter your username: ")
+                    return
+                except (ConnectionRefusedError, ConnectionResetError, asyncio.IncompleteReadError):
+                    self.close()
+                    await asyncio.sleep(0.05 * (attempt + 1))
+            raise ConnectionError(f"{self.name} could not connect")
+
+    async def within_timeout(self, read, waiting_for):
+        """setup reads give up after SETUP_TIMEOUT rather than hang on a server that
+        answered something else"""
+        try:
+            return await asyncio.wait_for(read, SETUP_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise SetupError(f"{self.name}: no {waiting_for} after {SETUP_TIMEOUT:g}s") from None
+
+    async def expect(self, text):
+        """reads until text shows up, returns everything read"""
+        data = await self.within_timeout(self.reader.readuntil(text.encode()), repr(text))
+        return data.decode(errors="replace")
+
+    def send(self, line):
+        self.writer.write(f"{line}\n".encode())
+
+    async def login(self, password=None):
+        self.send(self.name)
+        if password is not None:
+            # nothing comes before the prompt, a known user gets exactly these bytes first
+            data = await self.within_timeout(self.reader.readexactly(len(PASSWORD_PROMPT)),
+                                             "password prompt")
+            if data != PASSWORD_PROMPT:
+                raise SetupError(f"{self.name} was logged in as a guest instead of asked for a "
+                                 "password, the server doesn't know the user")
+            self.send(password)
+        await self.expect(":0> ")
+
+    async def command(self, line, reply):
+        """sends one command and waits for the reply that contains reply"""
+        self.send(line)
+        return await self.expect(reply)
+
+    async def read_forever(self):
+        try:
+            while True:
+                line = await self.reader.readline()
+                if not line:
+                    return
+                self.stats.received(line)
+        except (OSError, asyncio.LimitOverrunError, asyncio.IncompleteReadError):
+            pass
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        op, _, weight = part.partition("=")
+        if op not in ("say", "shout", "tell", "join") or not weight.isdigit():
+            raise ValueError(f"bad mix entry '{part}'")
+        mix[op] = int(weight)
+    if not sum(mix.values()):
+        raise ValueError("mix weights add up to 0")
+    return mix
+
+
+def rss_bytes(pid):
+    """resident memory of the server process"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    return 0
+
+
+def spawn_server(port, server_args):
+    """starts the chat server in a scratch directory so it doesn't touch the real data"""
+    workdir = tempfile.mkdtemp(prefix="chat_load_")
+    for name in MSG_FILES:
+        shutil.copy(os.path.join(HERE, name), workdir)
+    proc = subprocess.Popen([sys.executable, SERVER, str(port)] + server_args.split(),
+                            cwd=workdir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return proc, workdir
+
+
+async def setup(args, stats):
+    """registers the users, opens the rooms and logs everyone in"""
+    gate = asyncio.Semaphore(args.connect_concurrency)
+
+    admin = Client("setup", stats)
+    await admin.connect(args.host, args.port, gate)
+    await admin.login()
+    for i in range(args.users):
+        # a rerun against the same data finds them already registered, that's fine
+        await admin.command(f"register lg{i} {PASSWORD}", "> ")
+    admin.send("quit")
+    admin.close()
+
+    # the host leads every room and never leaves, so the rooms stay open
+    host = Client("lg0", stats)
+    await host.connect(args.host, args.port, gate)
+    await host.login(PASSWORD)
+    room_ids = []
+    for r in range(args.rooms):
+        reply = await host.command(f"start load room {r}", "> ")
+        room_ids.append(int(re.search(r"Started room (\d+)", reply).group(1)))
+
+    users = [host] + [Client(f"lg{i}", stats) for i in range(1, args.users)]
+    guests = [Client(f"guest{i}", stats) for i in range(args.guests)]
+
+    async def login(client, password):
+        if client is not host:
+            await client.connect(args.host, args.port, gate)
+            await client.login(password)
+        client.room = random.choice(room_ids)
+        if password is not None:
+            await client.command(f"join {client.room}", "> ")
+
+    await asyncio.gather(*(login(u, PASSWORD) for u in users),
+                         *(login(g, None) for g in guests))
+    return users, guests, room_ids
+
+
+async def drive(client, users, room_ids, ops, weights, rate, stats):
+    """sends commands at rate per second with random (poisson) gaps"""
+    while True:
+        await asyncio.sleep(random.expovariate(rate))
+        op = random.choices(ops, weights)[0]
+        stamp = f"@{time.monotonic_ns()}"
+        if op == "say":
+            client.send(f"say {client.room} {stamp}")
+        elif op == "shout":
+            client.send(f"shout {stamp}")
+        elif op == "tell":
+            client.send(f"tell {random.choice(users).name} {stamp}")
+        else:
+            # hop rooms so each user stays in exactly one and say fan out holds steady
+            new_room = random.choice(room_ids)
+            if new_room != client.room and client.name != "lg0":
+                client.send(f"leave {client.room}")
+                client.room = new_room
+            client.send(f"join {client.room}")
+        stats.command(op)
+
+
+def percentile(ordered, p):
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))] / 1e6
+
+
+async def run(args, mix, server_pid):
+    stats = Stats()
+    t0 = time.perf_counter()
+    users, guests, room_ids = await setup(args, stats)
+    print(f"connected {len(users)} users and {len(guests)} guests in {time.perf_counter() - t0:.1f}s")
+
+    everyone = users + guests
+    readers = [asyncio.create_task(c.read_forever()) for c in everyone]
+    ops, weights = list(mix), list(mix.values())
+    per_client = args.rate / len(users)
+    drivers = [asyncio.create_task(drive(u, users, room_ids, ops, weights, per_client, stats))
+               for u in users]
+
+    rss_start = rss_peak = rss_bytes(server_pid) if server_pid else 0
+    await asyncio.sleep(args.warmup)
+    stats.measuring = True
+    start = time.perf_counter()
+    while time.perf_counter() - start < args.seconds:
+        await asyncio.sleep(min(1.0, args.seconds))
+        if server_pid:
+            rss_peak = max(rss_peak, rss_bytes(server_pid))
+    elapsed = time.perf_counter() - start
+    stats.measuring = False
+
+    for task in drivers + readers:
+        task.cancel()
+    await asyncio.gather(*drivers, *readers, return_exceptions=True)
+    for c in everyone:
+        c.close()
+    return stats, elapsed, rss_start, rss_peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="connections, rates and delivery latency")
+    parser.add_argument("port", type=int)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--users", type=int, default=200, help="registered users sending commands")
+    parser.add_argument("--guests", type=int, default=0, help="idle guest connections on top")
+    parser.add_argument("--rooms", type=int, default=5)
+    parser.add_argument("--rate", type=float, default=200.0, help="total commands per second")
+    parser.add_argument("--mix", default="say=60,shout=2,tell=28,join=10",
+                        help="relative weights of say, shout, tell and join")
+    parser.add_argument("--seconds", type=float, default=10.0, help="length of the measured window")
+    parser.add_argument("--warmup", type=float, default=2.0, help="load before measuring starts")
+    parser.add_argument("--connect-concurrency", type=int, default=4,
+                        help="connections being opened at once, keep it under the server's listen backlog")
+    parser.add_argument("--seed", type=int, default=None)
+    server = parser.add_mutually_exclusive_group()
+    server.add_argument("--pid", type=int, help="server process to report RSS for")
+    server.add_argument("--spawn", metavar="ARGS",
+                        help="start the server with these args after the port, e.g. \"asyncio\"")
+    args = parser.parse_args()
+    if args.users < 2 or args.rooms < 1:
+        parser.error("need at least 2 users and 1 room")
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+    random.seed(args.seed)
+
+    # every connection is a file descriptor, thousands of them need more than the default
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+    proc = None
+    server_pid = args.pid
+    if args.spawn is not None:
+        proc, workdir = spawn_server(args.port, args.spawn)
+        server_pid = proc.pid
+        time.sleep(1.0)
+
+    print(f"users={args.users} guests={args.guests} rooms={args.rooms} rate={args.rate:g}/s "
+          f"mix={args.mix} seconds={args.seconds:g}")
+    try:
+        stats, elapsed, rss_start, rss_peak = asyncio.run(run(args, mix, server_pid))
+    except SetupError as e:
+        sys.exit(f"setup failed: {e}")
+    finally:
+        if proc is not None:
+            # Ctrl-C lets the server flush and exit on its own
+            proc.send_signal(signal.SIGINT)
+            try:
+                proc.wait(10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    sent = sum(stats.sent.values())
+    by_op = " ".join(f"{op} {stats.sent.get(op, 0) / elapsed:.0f}" for op in mix)
+    ordered = sorted(stats.latencies)
+    print(f"commands   {sent / elapsed:>10.0f}/s  ({by_op})")
+    print(f"deliveries {stats.delivered / elapsed:>10.0f}/s  errors {stats.errors}")
+    print(f"latency    p50 {percentile(ordered, 0.50):.2f} ms  p99 {percentile(ordered, 0.99):.2f} ms  "
+          f"max {percentile(ordered, 1.0):.2f} ms")
+    if server_pid:
+        print(f"server rss {rss_start / 2**20:.1f} MB at start, {rss_peak / 2**20:.1f} MB peak")
+
+
+if __name__ == "__main__":
+    main()
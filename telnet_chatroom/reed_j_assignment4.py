@@ -13,9 +13,14 @@ import os
 import json 
 import time
 import sys
+import sqlite3
+import signal
+import asyncio
+import selectors
 
-from socket import socket, gethostname
-from threading import Thread, Lock
+from collections import deque
+from socket import socket, gethostname, SHUT_RDWR, SOL_SOCKET, SO_REUSEADDR
+from threading import Thread, Lock, Condition
 
 GOODBYEMSGFILE = "./goodbye.txt"
 BEFORELOGINMSGFILE = "./prelogin.txt"
@@ -43,6 +48,43 @@ HELP_TEXT = (
 
 USER_DB = "./users.json"
 BLOCK_DB = "./blocks.json"
+JOURNAL_DB = "./chat.journal"
+SQLITE_DB = "./chat.db"
+
+# the journal is rewritten once it has this many times more records than there are live keys
+COMPACT_FACTOR = 4
+COMPACT_MIN = 1000
+
+# asyncio backend: bytes buffered per connection before reads pause / the sender waits
+RECV_LIMIT = 4096
+SEND_HIGH_WATER = 64 * 1024
+
+# bytes asked for per read, and the longest line kept before it's cut into a command
+RECV_SIZE = 4096
+MAX_LINE = 4096
+
+# bytes that can wait to be sent to one client, past that OVERFLOW_POLICY applies:
+# "drop" discards the message, "disconnect" drops the client
+OUTBOX_LIMIT = 256 * 1024
+OVERFLOW_POLICY = "disconnect"
+POLICIES = ("drop", "disconnect")
+
+# a client's own commands stop running once this many bytes of its output are waiting and
+# carry on once it has read them, so a burst of commands is slowed down instead of counting
+# as a slow client. leaves room under OUTBOX_LIMIT for the largest single reply
+PAUSE_OUTPUT = 64 * 1024
+
+# a change waits at most FLUSH_INTERVAL seconds, or until FLUSH_THRESHOLD changes pile up
+FLUSH_INTERVAL = 1.0
+FLUSH_THRESHOLD = 100
+
+# messages a room keeps to replay to whoever joins, the oldest falls off once it's full.
+# entries are the same bytes that were broadcast, about MAX_LINE at most, so a room holds
+# roughly ROOM_HISTORY * MAX_LINE bytes. keep that well under OUTBOX_LIMIT, the replay is
+# one write. 0 turns history off, history=<n> on the command line sets it
+ROOM_HISTORY = 20
+# marks replayed lines so a client can tell them from messages sent after it joined
+HISTORY_PREFIX = b"[history] "
 
 beforeLoginMsg = ''
 goodbyeMsg = ''
@@ -58,48 +100,288 @@ def loadMsgs():
         goodbyeMsg = f.read()
     with open(WELCOMEMSGFILE, "r") as f:
         welcomeMsg = f.read()
-                
-n = len(sys.argv)
-if (n != 2):
-    print("Usage: server_port")
-    exit()
-
-loadMsgs()
 
 users = {} 
 online_users = {}
 blocks = {}
-data_lock = Lock()
+data_lock = Lock()      # users and blocks, the data that gets saved
 rooms = {}
 room_seq = 1
 
+# online_users and rooms are copy on write: a writer builds a new dict under its lock and
+# swaps it in, readers use whichever dict is current without taking any lock
+online_lock = Lock()
+rooms_lock = Lock()     # also covers room_seq
+# online_users.values() as a tuple, published along with it so broadcasts don't build a list
+online_list = ()
+
+# username -> frozenset of the users blocking them, kept with blocks under data_lock.
+# a broadcast only has to skip the sender's blockers instead of checking everyone's list
+blocked_by = {}
+
+def set_online(username, user):
+    global online_users, online_list
+    with online_lock:
+        updated = dict(online_users)
+        updated[username] = user
+        online_users, online_list = updated, tuple(updated.values())
+
+def set_offline(username):
+    global online_users, online_list
+    with online_lock:
+        updated = dict(online_users)
+        updated.pop(username, None)
+        online_users, online_list = updated, tuple(updated.values())
+
+def build_block_index():
+    index = {}
+    for name, blocked in blocks.items():
+        for target in blocked:
+            index.setdefault(target, set()).add(name)
+    return {target: frozenset(names) for target, names in index.items()}
+
+def write_json(path, data):
+    """writes to a temp file and renames it over path so a crash never leaves half a file"""
+    tmp = path + ".tmp"
+    with open(tmp, 'w') as f:
+        json.dump(data, f, indent=4)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+def snapshot(user_names, block_names):
+    """copies the changed entries under data_lock, None for ones that are gone"""
+    with data_lock:
+        changed_users = {name: dict(users[name]) if name in users else None for name in user_names}
+        changed_blocks = {name: list(blocks[name]) if name in blocks else None for name in block_names}
+    return changed_users, changed_blocks
+
+class JsonStorage:
+    """users.json and blocks.json, both rewritten in full whenever anything changed"""
+    def load(self):
+        try:
+            with open(USER_DB, 'r') as f:
+                loaded_users = json.load(f)
+        except FileNotFoundError:
+            loaded_users = {}
+        try: 
+            with open(BLOCK_DB, 'r') as f:
+                loaded_blocks = json.load(f)
+        except FileNotFoundError:
+            loaded_blocks = {}
+        return loaded_users, loaded_blocks
+
+    def write(self, user_names, block_names):
+        with data_lock:
+            users_copy = {name: dict(u) for name, u in users.items()}
+            blocks_copy = {name: list(b) for name, b in blocks.items()}
+        write_json(USER_DB, users_copy)
+        write_json(BLOCK_DB, blocks_copy)
+
+    def close(self):
+        pass
+
+class JournalStorage:
+    """an append only file with one ["user"|"blocks", name, value] line per change, so a
+    write costs the size of what changed. replaying it gives the latest value of every key
+    and it's compacted down to one line per key once it gets long"""
+    def __init__(self, path=JOURNAL_DB):
+        self.path = path
+        self.records = 0
+        self.f = None
+
+    def load(self):
+        loaded = {"user": {}, "blocks": {}}
+        complete, skipped = 0, 0
+        try:
+            with open(self.path, 'rb') as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        # torn last line from a crash mid write
+                        break
+                    complete += len(line)
+                    try:
+                        kind, name, value = json.loads(line)
+                    except (ValueError, TypeError):
+                        skipped += 1
+                        continue
+                    # a record this version doesn't know is skipped rather than stopping startup
+                    if kind not in loaded or not isinstance(name, str):
+                        skipped += 1
+                        continue
+                    if value is None:
+                        loaded[kind].pop(name, None)
+                    else:
+                        loaded[kind][name] = value
+                    self.records += 1
+            # cut the torn line off, or the next record would be glued onto it and lost too
+            if os.path.getsize(self.path) > complete:
+                os.truncate(self.path, complete)
+        except FileNotFoundError:
+            pass
+        if skipped:
+            print(f"skipped {skipped} unreadable journal records")
+        self.f = open(self.path, 'a')
+        return loaded["user"], loaded["blocks"]
+
+    def append(self, f, kind, entries):
+        for name, value in entries.items():
+            f.write(json.dumps([kind, name, value]) + "\n")
+
+    def write(self, user_names, block_names):
+        changed_users, changed_blocks = snapshot(user_names, block_names)
+        self.append(self.f, "user", changed_users)
+        self.append(self.f, "blocks", changed_blocks)
+        self.f.flush()
+        os.fsync(self.f.fileno())
+        self.records += len(changed_users) + len(changed_blocks)
+        if self.records > max(COMPACT_MIN, COMPACT_FACTOR * (len(users) + len(blocks))):
+            self.compact()
+
+    def compact(self):
+        """rewrites the journal as one line per live key, swapped in with a rename"""
+        all_users, all_blocks = snapshot(list(users), list(blocks))
+        tmp = self.path + ".tmp"
+        with open(tmp, 'w') as f:
+            self.append(f, "user", all_users)
+            self.append(f, "blocks", all_blocks)
+            f.flush()
+            os.fsync(f.fileno())
+        self.f.close()
+        os.replace(tmp, self.path)
+        self.f = open(self.path, 'a')
+        self.records = len(all_users) + len(all_blocks)
+
+    def close(self):
+        if self.f:
+            self.f.close()
+
+class SqliteStorage:
+    """users and blocks as rows keyed by username, a write only touches the changed rows"""
+    def __init__(self, path=SQLITE_DB):
+        self.path = path
+        self.db = None
+
+    def load(self):
+        # only the writer thread uses it after load
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        with self.db:
+            self.db.execute("CREATE TABLE IF NOT EXISTS users (name TEXT PRIMARY KEY, "
+                            "password TEXT, info TEXT, online INTEGER)")
+            self.db.execute("CREATE TABLE IF NOT EXISTS blocks (name TEXT, blocked TEXT, "
+                            "PRIMARY KEY (name, blocked))")
+        loaded_users = {name: {"password": password, "info": info, "online": bool(online)}
+                        for name, password, info, online in self.db.execute("SELECT * FROM users")}
+        loaded_blocks = {}
+        for name, blocked in self.db.execute("SELECT name, blocked FROM blocks"):
+            loaded_blocks.setdefault(name, []).append(blocked)
+        return loaded_users, loaded_blocks
+
+    def write(self, user_names, block_names):
+        changed_users, changed_blocks = snapshot(user_names, block_names)
+        with self.db:
+            for name, u in changed_users.items():
+                if u is None:
+                    self.db.execute("DELETE FROM users WHERE name = ?", (name,))
+                else:
+                    self.db.execute("INSERT OR REPLACE INTO users VALUES (?, ?, ?, ?)",
+                                    (name, u.get("password"), u.get("info", ""), int(bool(u.get("online")))))
+            for name, blocked in changed_blocks.items():
+                self.db.execute("DELETE FROM blocks WHERE name = ?", (name,))
+                self.db.executemany("INSERT OR IGNORE INTO blocks VALUES (?, ?)",
+                                    [(name, b) for b in blocked or ()])
+
+    def close(self):
+        if self.db:
+            self.db.close()
+
+STORAGES = {"json": JsonStorage, "journal": JournalStorage, "sqlite": SqliteStorage}
+storage = JsonStorage()
+
 def load_data():
-    """Load users and blocks from files at startup"""
+    """Load users and blocks from storage at startup"""
     global users, blocks
-    
-    try:
-        with open('users.json', 'r') as f:
-            users = json.load(f)
-    except FileNotFoundError:
-        users = {}
-    
-    try: 
-        with open('blocks.json', 'r') as f:
-            blocks = json.load(f)
-    except FileNotFoundError:
-        blocks = {}
-    
-    print("data loaded from files")
+    global blocked_by
+    users, blocks = storage.load()
+    blocked_by = build_block_index()
+    print("data loaded from storage")
 
-def save_data():
-    """Saves user and blocks to JSON"""
-    with data_lock:
-        with open('users.json', 'w') as f: 
-            json.dump(users, f, indent=4)
-        with open('blocks.json', 'w') as f:
-            json.dump(blocks, f, indent=4)
+class WriteBehind:
+    """writes the changed users and blocks from a background thread, at most interval
+    seconds after the first unsaved change or once threshold changes have piled up.
+    a name changed several times before a flush is only written once"""
+    def __init__(self, interval=FLUSH_INTERVAL, threshold=FLUSH_THRESHOLD):
+        self.interval = interval
+        self.threshold = threshold
+        self.cond = Condition()
+        self.pending = 0
+        self.dirty = {"user": set(), "blocks": set()}
+        self.dirty_since = 0.0
+        self.stopping = False
+        self.thread = Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
 
-load_data()
+    def mark_dirty(self, kind, name):
+        with self.cond:
+            self.dirty[kind].add(name)
+            self.pending += 1
+            if self.pending == 1:
+                self.dirty_since = time.monotonic()
+                self.cond.notify()
+            elif self.pending >= self.threshold:
+                self.cond.notify()
+
+    def run(self):
+        while True:
+            with self.cond:
+                while not self.pending and not self.stopping:
+                    self.cond.wait()
+                deadline = self.dirty_since + self.interval
+                while self.pending < self.threshold and not self.stopping:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.cond.wait(remaining)
+                if not self.pending:
+                    return
+                changed, self.dirty = self.dirty, {"user": set(), "blocks": set()}
+                self.pending = 0
+            try:
+                storage.write(changed["user"], changed["blocks"])
+            except (OSError, sqlite3.Error) as e:
+                print(f"Saving data failed: {e}")
+                # a locked database or a full disk can pass, try these again next flush.
+                # not once stopping, the final flush would loop forever
+                if not self.stopping:
+                    for kind, names in changed.items():
+                        for name in names:
+                            self.mark_dirty(kind, name)
+
+    def stop(self):
+        """flushes anything pending, waits for the writer to finish and closes the storage"""
+        with self.cond:
+            self.stopping = True
+            self.cond.notify()
+        self.thread.join()
+        storage.close()
+
+persistence = None
+
+def save_user(username):
+    """Queues a save of one user, written right away if nothing is running the writer"""
+    if persistence is None:
+        storage.write([username], [])
+    else:
+        persistence.mark_dirty("user", username)
+
+def save_blocks(username):
+    """Queues a save of one user's block list"""
+    if persistence is None:
+        storage.write([], [username])
+    else:
+        persistence.mark_dirty("blocks", username)
 
 class User:
     def __init__(self, username, sock, is_guest=True) -> None:
@@ -108,88 +390,135 @@ class User:
         self.is_guest = is_guest
         self.rooms = set() 
         self.info = ""
-        self.blocked = set()
+        # replaced rather than changed, so other threads can check it without a lock
+        self.blocked = frozenset()
 
         with data_lock:
             if username in users and users[username].get("password"):
                 self.is_guest = False
                 self.info = users[username].get("info", "")
-                self.blocked = set(blocks.get(username, []))
+                self.blocked = frozenset(blocks.get(username, []))
                 users[username]["online"] = True
-                online_users[username] = self
                 blocks.setdefault(username, list(self.blocked))
             else:
                 self.is_guest = True
+        if not self.is_guest:
+            set_online(username, self)
 
         if not self.is_guest:
-            save_data()
+            save_user(username)
+            save_blocks(username)
 
         print(f"User: {self.username} logged in (guest: {self.is_guest})")
     
     def logout(self):
         """cleanup on disconnect"""
         with data_lock:
-            if self.username in users:
+            was_user = self.username in users
+            if was_user:
                 users[self.username]["online"] = False
-                del online_users[self.username]
+        if was_user:
+            set_offline(self.username)
         self.rooms.clear()
         try:
             self.sock.close()
-        except:
+        except OSError:
             pass
-        save_data()
+        if not self.is_guest:
+            save_user(self.username)
 
 class Room:
-    def __init__(self, topic, leader) -> None:
-        global room_seq
-        with data_lock:
-            self.id = room_seq
-            room_seq += 1
+    """members and history are guarded by the room's own lock, a closed room refuses joins"""
+    def __init__(self, room_id, topic, leader) -> None:
+        self.id = room_id
         self.topic = topic
         self.leader = leader
+        self.lock = Lock()
+        self.closed = False
         self.members = set([leader.username])
+        # (sender, message bytes), newest last
+        self.history = deque(maxlen=ROOM_HISTORY)
         leader.rooms.add(self.id)
         print(f"Room {self.id} started {topic} by {leader.username}")
 
     def add_member(self, user):
-        self.members.add(user.username)
+        """returns the recent messages as one bytes, leaving out senders the user blocks,
+        or None if the user was already in the room"""
+        with self.lock:
+            if self.closed:
+                raise ValueError("Room does not exist")
+            if user.username in self.members:
+                return None
+            self.members.add(user.username)
+            # taken together with the add, so every message is either in here or sent live
+            history = list(self.history)
         user.rooms.add(self.id)
+        blocked = user.blocked
+        return b"".join(HISTORY_PREFIX + msg for sender, msg in history if sender not in blocked)
 
-    def remove_member_old(self, user):
-        should_close = False
-        with data_lock:
-            if self.id not in rooms:
+    def member_list(self):
+        with self.lock:
+            if self.closed:
                 raise ValueError("Room does not exist")
-            was_leader = (self.leader and user.username == self.leader.username)
-            self.members.discard(user.username)
-            user.rooms.discard(self.id)
-            should_close = was_leader or not self.members
-            if should_close:
-                del rooms[self.id]
-                close_msg = f"!!system!!: Room {self.id}(topic: {self.topic}) closed\n"
-        if close_msg: broadcast_online(close_msg)
+            return list(self.members)
+
+    def post(self, sender, msg_bytes):
+        """keeps the message in the history, returns the members to send it to"""
+        with self.lock:
+            if self.closed:
+                raise ValueError("Room does not exist")
+            if sender not in self.members:
+                raise ValueError("Not in room")
+            self.history.append((sender, msg_bytes))
+            return list(self.members)
 
     def remove_member(self, user):
-        close_msg = None
-        should_close = None
-        with data_lock:
-            if self.id not in rooms:
+        with self.lock:
+            if self.closed:
                 raise ValueError("Room does not exist")
+            if user.username not in self.members:
+                raise ValueError("You must join the room")
             was_leader = (self.leader and user.username == self.leader.username)
             self.members.discard(user.username)
-            user.rooms.discard(self.id)
             should_close = was_leader or not self.members
             if should_close:
-                # cleanup memebers before close
-                for name in list(self.members):
-                    u = online_users.get(name)
-                    if u:
-                        u.rooms.discard(self.id)
+                self.closed = True
+                left = list(self.members)
                 self.members.clear()
-                del rooms[self.id]
-                close_msg = f"!!system!!: Room {self.id}(topic: {self.topic}) closed\n"
-        if close_msg:
-            broadcast_online(close_msg)
+        user.rooms.discard(self.id)
+        if should_close:
+            # cleanup memebers before close
+            for name in left:
+                u = online_users.get(name)
+                if u:
+                    u.rooms.discard(self.id)
+            close_room(self.id)
+            broadcast_online(f"!!system!!: Room {self.id}(topic: {self.topic}) closed\n")
+
+def open_room(topic, leader):
+    global rooms, room_seq
+    with rooms_lock:
+        if any(r.topic == topic for r in rooms.values()):
+            raise ValueError("topics exists")
+        room = Room(room_seq, topic, leader)
+        room_seq += 1
+        updated = dict(rooms)
+        updated[room.id] = room
+        rooms = updated
+    return room
+
+def close_room(room_id):
+    global rooms
+    with rooms_lock:
+        updated = dict(rooms)
+        updated.pop(room_id, None)
+        rooms = updated
+
+def get_room(room_id):
+    room = rooms.get(room_id)
+    if room is None:
+        raise ValueError("Room does not exist")
+    return room
 
 def process_cmd(user: User, cmd_str, cmd_count):
     parts = cmd_str.split()
@@ -207,7 +536,7 @@ def process_cmd(user: User, cmd_str, cmd_count):
             'quit': lambda u, a: cmd_quit(u),
         }
         if command not in allowed_commands:
-            mySendAll(sock, "You are logged in as a guest. The only commands that you can user are \n"
+            mySendAll(user.sock, "You are logged in as a guest. The only commands that you can user are \n"
                     "'register username password', 'exit', and 'quit'. \n".encode()) 
             return
 
@@ -245,8 +574,7 @@ def cmd_help(user, args):
     mySendAll(user.sock, HELP_TEXT.encode())
 
 def cmd_who(user, args):
-    with data_lock:
-        online = list(online_users.keys())
+    online = list(online_users.keys())
     msg = "online users: " + ", ".join(online) + "\n"
     mySendAll(user.sock, msg.encode())
 
@@ -263,11 +591,7 @@ def cmd_start(user, args):
     if len(args) < 1:
         raise ValueError("missing args")
     topic = " ".join(args)
-    if any(r.topic == topic for r in rooms.values()):
-        raise ValueError("topics exists")
-    new_room = Room(topic, user)
-    with data_lock: 
-        rooms[new_room.id] = new_room
+    new_room = open_room(topic, user)
     mySendAll(user.sock, f"Started room {new_room.id}: {topic}\n".encode())
 
 def cmd_rooms(user, args):
@@ -275,49 +599,44 @@ def cmd_rooms(user, args):
         mySendAll(user.sock, "No active rooms\n".encode())
         return
     msg = "Active rooms:\n"
-    with data_lock:
-        snapshot = list(rooms.items())
-    for rid, room in snapshot:
-        participants = ", ".join(sorted(room.members))
+    for rid, room in rooms.items():
+        try:
+            members = room.member_list()
+        except ValueError:
+            continue
+        participants = ", ".join(sorted(members))
         msg += (f"Room {rid}: , topic: {room.topic}\n"
-                f"{len(room.members)} Participant(s): {participants}\n\n")
+                f"{len(members)} Participant(s): {participants}\n\n")
     mySendAll(user.sock, msg.encode())
 
 def cmd_join(user, args):
     if len(args) != 1 or not args[0].isdigit():
         raise ValueError("Incorrect format: join <room number>")
     room_id = int(args[0])
-    with data_lock:
-        if room_id not in rooms:
-            raise ValueError("Room does not exist")
-        room = rooms[room_id]
-        if user.username in room.members:
-            mySendAll(user.sock, f"You are already in Room {room_id}.\n".encode())
-            return 
-        room.add_member(user)
-    mySendAll(user.sock, f"You joined Room {room_id}.\n".encode())
+    history = get_room(room_id).add_member(user)
+    if history is None:
+        mySendAll(user.sock, f"You are already in Room {room_id}.\n".encode())
+        return 
+    # the catch up goes out in the same write as the reply
+    mySendAll(user.sock, f"You joined Room {room_id}.\n".encode() + history)
 
 def cmd_leave(user, args):
     if len(args) != 1 or not args[0].isdigit():
         raise ValueError("Incorrect format")
     room_id = int(args[0])
-    with data_lock:
-        if room_id not in rooms:
-            raise ValueError("Room does not exist")
-        room = rooms[room_id]
-        if user.username not in room.members:
-            raise ValueError("You must join the room")
-    room.remove_member(user)
+    get_room(room_id).remove_member(user)
     mySendAll(user.sock, f"Left room {room_id}.\n".encode())
 
 def broadcast_online(msg, exclude=None, sender=None):
+    """encodes msg once and sends the same bytes to everyone online except exclude and
+    whoever blocks sender"""
     msg_bytes = msg.encode() if isinstance(msg, str) else msg
-    with data_lock:
-        targets = [
-            uobj for uname, uobj in online_users.items()
-                if uname != exclude and not (sender and sender.username in uobj.blocked)
-        ]
-    for uobj in targets:
+    skip = blocked_by.get(sender.username, frozenset()) if sender else frozenset()
+    if exclude is not None:
+        skip = skip | {exclude}
+    for uobj in online_list:
+        if skip and uobj.username in skip:
+            continue
         mySendAll(uobj.sock, msg_bytes)
 
 def cmd_shout(user, args):
@@ -331,13 +650,12 @@ def cmd_tell(user, args):
         raise ValueError("Incorrect format")
     target = args[0]
     message = " ".join(args[1:])
-    with data_lock:
-        if target not in online_users:
-            raise ValueError("User is not online")
-        targ_usr = online_users[target]
-        if user.username in targ_usr.blocked:
-            mySendAll(user.sock, f"Message blocked by {target}.\n".encode())
-            return
+    targ_usr = online_users.get(target)
+    if targ_usr is None:
+        raise ValueError("User is not online")
+    if user.username in targ_usr.blocked:
+        mySendAll(user.sock, f"Message blocked by {target}.\n".encode())
+        return
     msg = f"{user.username} tells you {message}\n"
     mySendAll(targ_usr.sock, msg.encode())
     mySendAll(user.sock, f"Told {target}.\n".encode())
@@ -351,7 +669,7 @@ def cmd_info(user, args):
     with data_lock:
         if user.username in users:
             users[user.username]["info"] = new_info
-    save_data()
+    save_user(user.username)
     mySendAll(user.sock, "Info updated\n".encode())
 
 def cmd_quit(user):
@@ -364,10 +682,11 @@ def cmd_block(user, args):
     target = args[0]
     if target not in users:
         raise ValueError("User does not exist")
-    user.blocked.add(target)
+    user.blocked = user.blocked | {target}
     with data_lock:
         blocks[user.username] = list(user.blocked)
-    save_data()
+        blocked_by[target] = blocked_by.get(target, frozenset()) | {user.username}
+    save_blocks(user.username)
     mySendAll(user.sock, f"Blocked {target}.\n".encode())
 
 def cmd_unblock(user, args):
@@ -376,10 +695,11 @@ def cmd_unblock(user, args):
     target = args[0]
     if target not in users:
         raise ValueError("User does not exist")
-    user.blocked.discard(target)
+    user.blocked = user.blocked - {target}
     with data_lock:
         blocks[user.username] = list(user.blocked)
-    save_data()
+        blocked_by[target] = blocked_by.get(target, frozenset()) - {user.username}
+    save_blocks(user.username)
     mySendAll(user.sock, f"Unblocked {target}.\n".encode())
 
 def cmd_say(user, args):
@@ -387,17 +707,18 @@ def cmd_say(user, args):
         raise ValueError("Incorrect Format")
     room_id = int(args[0]) if args[0].isdigit() else -1
     msg = " ".join(args[1:])
-    with data_lock:
-        if room_id not in rooms:
-            raise ValueError("Room does not exist")
-        room = rooms[room_id]
-        if user.username not in room.members:
-            raise ValueError("Not in room")
-        msg = f"{user.username} in {room.topic}: {msg}\n"
-        for mem in room.members:
-            mem_usr = online_users.get(mem)
-            if mem_usr and user.username not in mem_usr.blocked:
-                mySendAll(mem_usr.sock, msg.encode())
+    room = get_room(room_id)
+    # one encode shared by every member and the room's history
+    msg_bytes = f"{user.username} in {room.topic}: {msg}\n".encode()
+    members = room.post(user.username, msg_bytes)
+    blockers = blocked_by.get(user.username, frozenset())
+    online = online_users
+    for mem in members:
+        if mem in blockers:
+            continue
+        mem_usr = online.get(mem)
+        if mem_usr:
+            mySendAll(mem_usr.sock, msg_bytes)
 
 def cmd_register(user, args):
     if len(args) < 2:
@@ -407,7 +728,7 @@ def cmd_register(user, args):
         if new_user in users:
             raise ValueError("User already exists")
         users[new_user] = {"password": passwd, "info": "", "online": False}
-    save_data()
+    save_user(new_user)
     mySendAll(user.sock, f"Registered new user '{new_user}'\n".encode())
 
 def cmd_unknown(user, args):
@@ -442,65 +763,560 @@ def processCmd(userName, sock, cmd):
     # perform according to the cmd, echo for now
     mySendAll(sock, f"Server response to '{cmd}'\n".encode())
 
-def handleOneClient(sock):
+class LineReader:
+    """per connection receive buffer. reads can hold several commands or part of one, so
+    complete lines are split off into lines and a partial line waits for the next read.
+    a line longer than MAX_LINE is cut there so the buffer stays bounded"""
+    def __init__(self):
+        self.partial = bytearray()
+        self.lines = deque()
+        self.eof = False
 
-    mySendAll(sock, beforeLoginMsg.encode())
-    mySendAll(sock, "Enter your username: ".encode())
+    def feed(self, data):
+        if not data:
+            # the client is gone, whatever it sent without a newline is still a command
+            self.eof = True
+            if self.partial:
+                self.lines.append(self.decode(self.partial))
+                self.partial = bytearray()
+            return
+        self.partial += data
+        if b"\n" in data:
+            *complete, rest = self.partial.split(b"\n")
+            self.lines.extend(self.decode(line) for line in complete)
+            self.partial = rest
+        while len(self.partial) > MAX_LINE:
+            self.lines.append(self.decode(self.partial[:MAX_LINE]))
+            del self.partial[:MAX_LINE]
 
-    data1 = sock.recv(1000).decode().strip()
-    if not data1:
-        sock.close()
-        return
-    username = data1.split()[0] # First word as username
-    password = None 
-    if username in users and users[username]["password"]:
-        mySendAll(sock, "Enter your password: ".encode())
-        pass_data = sock.recv(1000).decode().strip()
-        if pass_data != users[username]["password"]:
-            mySendAll(sock, "Login error: Invalid password.\n".encode())
-            sock.close()
-            return 
-        password = pass_data
+    @staticmethod
+    def decode(line):
+        return line.decode(errors="replace").rstrip("\r")
 
-    
-    user = User(username, sock, is_guest=(password is None))
-    cmdCount = 0
+    def next_line(self):
+        return self.lines.popleft()
 
-    mySendAll(sock, welcomeMsg.encode())
+    def take_lines(self):
+        lines = list(self.lines)
+        self.lines.clear()
+        return lines
 
-    if user.is_guest:
-        mySendAll(sock, "You are logged in as a guest. The only commands that you can user are \n"
-                  "'register username password', 'exit', and 'quit'. \n".encode())
-        user.username = "guest"
-        username = "guest"
-    else:
-        mySendAll(sock, HELP_TEXT.encode())
+def recvLines(sock, lines):
+    """reads until lines has a complete line, False once the client is gone and nothing is left"""
+    while not lines.lines and not lines.eof:
+        lines.feed(sock.recv(RECV_SIZE))
+    return bool(lines.lines)
+
+async def recvLinesAsync(reader, lines):
+    while not lines.lines and not lines.eof:
+        lines.feed(await reader.read(RECV_SIZE))
+    return bool(lines.lines)
+
+class Session:
+    """one client's conversation: the username and password prompts, then the command
+    loop. it's fed one line at a time and never reads from the socket itself, so the
+    threaded, asyncio and reactor backends all drive the same code"""
+    def __init__(self, sock):
+        self.sock = sock
+        self.state = "username"
+        self.username = None
+        self.user = None
+        self.cmdCount = 0
+        mySendAll(sock, beforeLoginMsg.encode())
+        mySendAll(sock, "Enter your username: ".encode())
+
+    def feed(self, line):
+        """handles one line, False once the connection should be closed"""
+        if self.state == "username":
+            data1 = line.strip()
+            if not data1:
+                return False
+            self.username = data1.split()[0] # First word as username
+            if self.username in users and users[self.username]["password"]:
+                mySendAll(self.sock, "Enter your password: ".encode())
+                self.state = "password"
+                return True
+            self.login(None)
+            return True
+
+        if self.state == "password":
+            pass_data = line.strip()
+            if pass_data != users[self.username]["password"]:
+                mySendAll(self.sock, "Login error: Invalid password.\n".encode())
+                return False
+            self.login(pass_data)
+            return True
+
+        self.cmdCount += 1
+        should_quit = process_cmd(self.user, line.strip(), self.cmdCount)
+        if should_quit:
+            return False
+        mySendAll(self.sock, f"<{self.user.username}:{self.cmdCount}> ".encode())
+        return True
+
+    def login(self, password):
+        self.user = User(self.username, self.sock, is_guest=(password is None))
+        self.state = "commands"
+
+        mySendAll(self.sock, welcomeMsg.encode())
+
+        if self.user.is_guest:
+            mySendAll(self.sock, "You are logged in as a guest. The only commands that you can user are \n"
+                      "'register username password', 'exit', and 'quit'. \n".encode())
+            self.user.username = "guest"
+            self.username = "guest"
+        else:
+            mySendAll(self.sock, HELP_TEXT.encode())
+
+        mySendAll(self.sock, f"<{self.user.username}:{self.cmdCount}> ".encode())
+
+    def run_lines(self, lines):
+        """runs the lines that have arrived, in order, with the replies corked so they go out
+        as one send. stops early once PAUSE_OUTPUT bytes are waiting for this client, the
+        rest stay in lines for when it has caught up. False once the connection should be
+        closed"""
+        self.sock.cork()
+        try:
+            while lines.lines:
+                if not self.feed(lines.next_line()):
+                    return False
+                # dropped as a slow client, the rest of its lines have nobody to run for
+                if self.sock.closed:
+                    return False
+                if self.sock.pending() >= PAUSE_OUTPUT:
+                    break
+            return True
+        finally:
+            self.sock.uncork()
+
+    def close(self):
+        """logs the user out, safe to call again from another close path"""
+        if self.state == "closed":
+            return
+        self.state = "closed"
+        if self.user is not None:
+            self.user.logout()
+        else:
+            self.sock.close()
+
+class QueuedConn:
+    """wraps a client's socket for the threaded backend. send only queues the data and a
+    writer thread per connection does the blocking sends, so a slow client never stalls
+    whoever is sending to it. at most OUTBOX_LIMIT bytes wait, then OVERFLOW_POLICY decides"""
+    def __init__(self, sock):
+        self.sock = sock
+        lock = Lock()
+        # cond wakes the writer, drained wakes a reader waiting on its own output
+        self.cond = Condition(lock)
+        self.drained = Condition(lock)
+        self.queue = deque()
+        self.queued = 0
+        self.closing = False
+        self.corked = False
+        self.dropped = 0
+        self.writer = Thread(target=self.drain, daemon=True)
+        self.writer.start()
+
+    def recv(self, n):
+        return self.sock.recv(n)
+
+    def send(self, data):
+        with self.cond:
+            if self.closing:
+                return 0
+            if self.queued + len(data) <= OUTBOX_LIMIT:
+                self.queue.append(data)
+                self.queued += len(data)
+                if not self.corked:
+                    self.cond.notify()
+                return len(data)
+            self.dropped += 1
+        if OVERFLOW_POLICY == "disconnect":
+            print("Disconnecting slow client")
+            self.abort()
+        return 0
+
+    def drain(self):
+        while True:
+            with self.cond:
+                while (not self.queue or self.corked) and not self.closing:
+                    self.cond.wait()
+                if not self.queue:
+                    break
+                # everything queued so far goes out in one send
+                data = b"".join(self.queue)
+                self.queue.clear()
+                self.queued = 0
+                self.drained.notify()
+            try:
+                self.sock.sendall(data)
+            except OSError:
+                self.abort()
+                break
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+    @property
+    def closed(self):
+        return self.closing
+
+    def pending(self):
+        return self.queued
+
+    def wait_drained(self):
+        """blocks until the writer has taken everything queued"""
+        with self.cond:
+            while self.queue and not self.closing:
+                self.drained.wait()
+
+    def cork(self):
+        """holds sends in the queue until uncork so a batch of replies goes out together"""
+        with self.cond:
+            self.corked = True
+
+    def uncork(self):
+        with self.cond:
+            self.corked = False
+            self.cond.notify()
+
+    def abort(self):
+        """drops whatever is queued and shuts the socket so the reader's recv returns
+        nothing and the client is logged out"""
+        with self.cond:
+            self.closing = True
+            self.queue.clear()
+            self.queued = 0
+            self.cond.notify()
+            self.drained.notify()
+        try:
+            self.sock.shutdown(SHUT_RDWR)
+        except OSError:
+            pass
+
+    def close(self):
+        """the writer sends what's still queued (the goodbye message) and then closes"""
+        with self.cond:
+            self.closing = True
+            self.cond.notify()
+
+def handleOneClient(sock):
+    sock = QueuedConn(sock)
+    lines = LineReader()
+    session = Session(sock)
 
-    mySendAll(sock, f"<{user.username}:{cmdCount}> ".encode())
-    
     while True:
         try:
-            data = sock.recv(1000).decode().strip()
-            if not data:
-                print(f"Client {username} disconnected")
+            if not recvLines(sock, lines):
+                print(f"Client {session.username} disconnected")
                 break
-            cmdCount += 1
-            should_quit = process_cmd(user, data, cmdCount)
-            if should_quit: break
-            mySendAll(sock, f"<{user.username}:{cmdCount}> ".encode())
+            if not session.run_lines(lines):
+                break
+            if lines.lines:
+                # paused behind its own replies, let the writer catch up first
+                sock.wait_drained()
         except Exception as e:
-            print(f"Error in {username}: {e}")
+            print(f"Error in {session.username}: {e}")
             break
-    user.logout()
-
-s = socket()
-print(sys.argv[0], sys.argv[1])
-
-s.bind(("127.0.0.1", int(sys.argv[1])))
-s.listen(5)
-        
-while True:
-    sock, addr = s.accept()
-    print("Receive client connection from ", addr)
-    p = Thread(target=handleOneClient, args=(sock,), daemon = True)
-    p.start()
\ No newline at end of file
+    session.close()
+
+class StreamConn:
+    """stands in for the socket under asyncio so the handlers can keep calling
+    mySendAll(user.sock, ...). send only appends to the transport's buffer, it never blocks.
+    past OUTBOX_LIMIT buffered bytes OVERFLOW_POLICY decides, like QueuedConn"""
+    def __init__(self, writer):
+        self.writer = writer
+        self.held = None
+        self.held_size = 0
+        self.dropped = 0
+
+    def send(self, data):
+        if self.writer.is_closing():
+            return 0
+        if self.writer.transport.get_write_buffer_size() + self.held_size + len(data) > OUTBOX_LIMIT:
+            self.dropped += 1
+            if OVERFLOW_POLICY == "disconnect":
+                print("Disconnecting slow client")
+                self.writer.transport.abort()
+            return 0
+        if self.held is not None:
+            self.held.append(data)
+            self.held_size += len(data)
+        else:
+            self.writer.write(data)
+        return len(data)
+
+    @property
+    def closed(self):
+        return self.writer.is_closing()
+
+    def pending(self):
+        return self.writer.transport.get_write_buffer_size() + self.held_size
+
+    def cork(self):
+        self.held = []
+
+    def uncork(self):
+        held, self.held, self.held_size = self.held, None, 0
+        if held and not self.writer.is_closing():
+            self.writer.write(b"".join(held))
+
+    def close(self):
+        self.writer.close()
+
+async def handleOneClientAsync(reader, writer):
+    """handleOneClient for the asyncio backend, one coroutine per connection"""
+    writer.transport.set_write_buffer_limits(high=SEND_HIGH_WATER)
+    sock = StreamConn(writer)
+    lines = LineReader()
+    session = Session(sock)
+
+    try:
+        while True:
+            try:
+                # wait for our own output to go out before reading more from this client
+                await writer.drain()
+                if not await recvLinesAsync(reader, lines):
+                    print(f"Client {session.username} disconnected")
+                    break
+                if not session.run_lines(lines):
+                    break
+            except ConnectionError:
+                # reset or gone before we could write, at any point of the login
+                print(f"Client {session.username} disconnected")
+                break
+            except Exception as e:
+                print(f"Error in {session.username}: {e}")
+                break
+    except asyncio.CancelledError:
+        # the server is shutting down, the finally logs this client out
+        pass
+    finally:
+        session.close()
+
+class ReactorConn:
+    """a non-blocking client socket for the reactor. send writes what the socket takes right
+    away and keeps the rest in an outbound buffer that's written when the selector says the
+    socket is writable. same OUTBOX_LIMIT, OVERFLOW_POLICY and cork as the other backends"""
+    def __init__(self, sock, sel):
+        self.sock = sock
+        self.sel = sel
+        self.client = None
+        self.out = bytearray()
+        self.corked = False
+        self.closing = False
+        self.closed = False
+        self.dropped = 0
+
+    def send(self, data):
+        if self.closing or self.closed:
+            return 0
+        if len(self.out) + len(data) > OUTBOX_LIMIT:
+            self.dropped += 1
+            if OVERFLOW_POLICY == "disconnect":
+                print("Disconnecting slow client")
+                self.abort()
+            return 0
+        self.out += data
+        if not self.corked:
+            self.flush()
+        return len(data)
+
+    def flush(self):
+        if self.closed:
+            return
+        try:
+            while self.out:
+                sent = self.sock.send(self.out)
+                del self.out[:sent]
+        except BlockingIOError:
+            pass
+        except OSError:
+            self.abort()
+            return
+        if not self.out and self.closing:
+            self.shut()
+            return
+        # only ask for writable events while there's something waiting, and stop reading
+        # while the client's commands are paused behind its own output
+        if not self.out:
+            events = selectors.EVENT_READ
+        elif self.client is not None and self.client.lines.lines:
+            events = selectors.EVENT_WRITE
+        else:
+            events = selectors.EVENT_READ | selectors.EVENT_WRITE
+        if self.sel.get_key(self.sock).events != events:
+            self.sel.modify(self.sock, events, self.client)
+
+    def pending(self):
+        return len(self.out)
+
+    def cork(self):
+        self.corked = True
+
+    def uncork(self):
+        self.corked = False
+        self.flush()
+
+    def close(self):
+        """closes once the outbound buffer (the goodbye message) has been written"""
+        self.closing = True
+        self.flush()
+
+    def shut(self):
+        self.closed = True
+        self.sel.unregister(self.sock)
+        self.sock.close()
+
+    def abort(self):
+        """drops the client right away and logs it out"""
+        if self.closed:
+            return
+        self.out.clear()
+        self.shut()
+        if self.client is not None and self.client.session is not None:
+            self.client.session.close()
+
+class ReactorClient:
+    def __init__(self, sock, sel):
+        self.conn = ReactorConn(sock, sel)
+        self.conn.client = self
+        self.lines = LineReader()
+        # the prompts Session sends can already find the client gone
+        self.session = None
+        sel.register(sock, selectors.EVENT_READ, self)
+        self.session = Session(self.conn)
+
+    def on_readable(self):
+        try:
+            data = self.conn.sock.recv(RECV_SIZE)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b""
+        self.lines.feed(data)
+        self.run()
+
+    def run(self):
+        """runs what has arrived. commands paused behind the client's own output carry on
+        from the selector loop once it's written"""
+        try:
+            still_open = self.session.run_lines(self.lines)
+            while still_open and self.lines.lines and not self.conn.out and not self.conn.closed:
+                still_open = self.session.run_lines(self.lines)
+        except Exception as e:
+            print(f"Error in {self.session.username}: {e}")
+            still_open = False
+        if still_open and self.lines.eof and not self.lines.lines:
+            print(f"Client {self.session.username} disconnected")
+            still_open = False
+        if not still_open:
+            self.session.close()
+
+def listenSocket(port):
+    s = socket()
+    s.setsockopt(SOL_SOCKET, SO_REUSEADDR, 1)
+    s.bind(("127.0.0.1", port))
+    s.listen(1024)
+    return s
+
+def serveReactor(port):
+    """single threaded: one selector waits on the listening socket and every client socket,
+    each client is a Session driven by whatever its socket has ready"""
+    sel = selectors.DefaultSelector()
+    s = listenSocket(port)
+    s.setblocking(False)
+    sel.register(s, selectors.EVENT_READ, None)
+
+    while True:
+        for key, events in sel.select():
+            if key.data is None:
+                while True:
+                    try:
+                        sock, addr = s.accept()
+                    except BlockingIOError:
+                        break
+                    print("Receive client connection from ", addr)
+                    sock.setblocking(False)
+                    ReactorClient(sock, sel)
+                continue
+            client = key.data
+            if client.conn.closed:
+                continue
+            if events & selectors.EVENT_WRITE:
+                client.conn.flush()
+                if client.lines.lines and not client.conn.out and not client.conn.closed:
+                    client.run()
+            if events & selectors.EVENT_READ and not client.conn.closed and not client.conn.closing:
+                client.on_readable()
+
+def serveThreads(port):
+    """one thread per connection"""
+    s = socket()
+    s.bind(("127.0.0.1", port))
+    s.listen(5)
+            
+    while True:
+        sock, addr = s.accept()
+        print("Receive client connection from ", addr)
+        p = Thread(target=handleOneClient, args=(sock,), daemon = True)
+        p.start()
+
+async def serveAsyncio(port):
+    """every connection is a coroutine on one event loop in this thread"""
+    server = await asyncio.start_server(handleOneClientAsync, "127.0.0.1", port,
+                                        limit=RECV_LIMIT, backlog=1024)
+    async with server:
+        await server.serve_forever()
+
+def serve(backend, port, storage_name="json", policy="disconnect", history=ROOM_HISTORY):
+    """runs the server until Ctrl-C or SIGTERM, then flushes the data"""
+    global persistence, storage, OVERFLOW_POLICY, ROOM_HISTORY
+    storage = STORAGES[storage_name]()
+    OVERFLOW_POLICY = policy
+    ROOM_HISTORY = history
+    loadMsgs()
+    load_data()
+
+    persistence = WriteBehind()
+    persistence.start()
+    # SIGTERM unwinds like Ctrl-C so the finally below still flushes
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        if backend == "asyncio":
+            asyncio.run(serveAsyncio(port))
+        elif backend == "reactor":
+            serveReactor(port)
+        else:
+            serveThreads(port)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # a second Ctrl-C or SIGTERM shouldn't cut the final flush short
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        persistence.stop()
+        print("data saved")
+
+if __name__ == "__main__":
+    # the options after the port can come in any order
+    backend, storage_name, policy, bad_args = "threads", "json", OVERFLOW_POLICY, len(sys.argv) < 2
+    history = ROOM_HISTORY
+    for arg in sys.argv[2:]:
+        if arg in ("threads", "asyncio", "reactor"):
+            backend = arg
+        elif arg in STORAGES:
+            storage_name = arg
+        elif arg in POLICIES:
+            policy = arg
+        elif arg.startswith("history=") and arg[len("history="):].isdigit():
+            history = int(arg[len("history="):])
+        else:
+            bad_args = True
+    if bad_args:
+        print("Usage: server_port [threads|asyncio|reactor] [json|journal|sqlite] [drop|disconnect] "
+              "[history=<messages per room>]")
+        exit()
+    print(sys.argv[0], sys.argv[1], backend)
+    serve(backend, int(sys.argv[1]), storage_name, policy, history)
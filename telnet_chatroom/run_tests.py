@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Checks for the chat server that need real sockets. Every check starts the server with each
+backend in a scratch directory, talks to it like a telnet client and stops it with Ctrl-C.
+
+usage: python run_tests.py [--backends threads,asyncio,reactor] [--port 9600] [-k name]
+"""
+
+import os
+import sys
+import time
+import shutil
+import signal
+import socket
+import struct
+import argparse
+import tempfile
+import threading
+import subprocess
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SERVER = os.path.join(HERE, "reed_j_assignment4.py")
+MSG_FILES = ("goodbye.txt", "prelogin.txt", "welcome.txt")
+TIMEOUT = 30.0
+
+
+class Server:
+    """the chat server as a subprocess in its own directory"""
+    def __init__(self, port, args):
+        self.port = port
+        self.workdir = tempfile.mkdtemp(prefix="chat_test_")
+        for name in MSG_FILES:
+            shutil.copy(os.path.join(HERE, name), self.workdir)
+        self.log = open(os.path.join(self.workdir, "log.txt"), "w")
+        self.proc = subprocess.Popen([sys.executable, SERVER, str(port)] + args,
+                                     cwd=self.workdir, stdout=self.log, stderr=subprocess.STDOUT)
+        deadline = time.monotonic() + 5
+        while True:
+            try:
+                socket.create_connection(("127.0.0.1", port)).close()
+                break
+            except OSError:
+                if time.monotonic() > deadline or self.proc.poll() is not None:
+                    raise RuntimeError(f"server didn't start:\n{self.output()}")
+                time.sleep(0.05)
+
+    def output(self):
+        self.log.flush()
+        with open(os.path.join(self.workdir, "log.txt")) as f:
+            return f.read()
+
+    def stop(self):
+        self.proc.send_signal(signal.SIGINT)
+        try:
+            self.proc.wait(10)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+        self.log.close()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+class Client:
+    def __init__(self, port):
+        self.sock = socket.create_connection(("127.0.0.1", port))
+        self.sock.settimeout(TIMEOUT)
+        self.buf = b""
+
+    def send(self, text):
+        self.sock.sendall(text.encode())
+
+    def read_until(self, marker):
+        """everything up to and including marker, fails if the server hangs up first"""
+        marker = marker.encode()
+        while marker not in self.buf:
+            data = self.sock.recv(1 << 16)
+            if not data:
+                raise AssertionError(f"connection closed while waiting for {marker!r}")
+            self.buf += data
+        end = self.buf.index(marker) + len(marker)
+        out, self.buf = self.buf[:end], self.buf[end:]
+        return out.decode(errors="replace")
+
+    def close(self):
+        self.sock.close()
+
+
+def register(port, name, password):
+    c = Client(port)
+    c.read_until("Enter your username: ")
+    c.send("setup\n")
+    c.read_until(":0> ")
+    c.send(f"register {name} {password}\nquit\n")
+    c.read_until(":1> ")
+    c.close()
+
+
+def login(port, name, password):
+    c = Client(port)
+    c.read_until("Enter your username: ")
+    c.send(f"{name}\n")
+    c.read_until("Enter your password: ")
+    c.send(f"{password}\n")
+    c.read_until(f"<{name}:0> ")
+    return c
+
+
+def burst(port, count):
+    """count commands sent without waiting for replies. every reply has to arrive, the
+    client's own replies mustn't count as it being a slow reader"""
+    register(port, "bot", "pw")
+    c = login(port, "bot", "pw")
+    # send from another thread, the server stops reading while the replies back up
+    sender = threading.Thread(target=c.send, args=("help\n" * count,), daemon=True)
+    sender.start()
+    out = c.read_until(f"<bot:{count}> ")
+    sender.join()
+    replies = out.count("Commands supported")
+    assert replies == count, f"{replies} of {count} help replies"
+    c.close()
+
+
+def test_burst_one_read(port):
+    # 819 commands fill one 4 KB read, about 1 MB of replies
+    burst(port, 819)
+
+
+def test_burst_many_reads(port):
+    burst(port, 20000)
+
+
+def test_reset_mid_burst(port):
+    # the client resets while its commands are still running, the server drops it once and
+    # a new login under the same name stays online
+    register(port, "bot", "pw")
+    c = login(port, "bot", "pw")
+    c.send("help\n" * 20000)
+    c.sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+    c.close()
+    time.sleep(0.5)
+    c = login(port, "bot", "pw")
+    time.sleep(1.0)
+    c.send("who\n")
+    out = c.read_until("<bot:1> ")
+    assert "bot" in out.split("online users:")[1], out
+    c.close()
+
+
+TESTS = [test_burst_one_read, test_burst_many_reads, test_reset_mid_burst]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="socket level checks for every backend")
+    parser.add_argument("--backends", default="threads,asyncio,reactor")
+    parser.add_argument("--port", type=int, default=9600, help="first port, each run takes the next")
+    parser.add_argument("-k", dest="match", default="", help="only tests whose name contains this")
+    args = parser.parse_args()
+
+    port, failed, ran = args.port, 0, 0
+    for test in TESTS:
+        if args.match not in test.__name__:
+            continue
+        for backend in args.backends.split(","):
+            server = Server(port, [backend])
+            t0 = time.perf_counter()
+            try:
+                test(port)
+                status = "PASS"
+            except (AssertionError, OSError) as e:
+                status = f"FAIL {e}\n" + server.output()[-2000:]
+                failed += 1
+            finally:
+                server.stop()
+            ran += 1
+            print(f"{test.__name__:<28} {backend:<8} {time.perf_counter() - t0:6.2f}s  {status}")
+            port += 1
+    print(f"{ran - failed}/{ran} passed")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()